@@ -0,0 +1,60 @@
+"""
+Time of 1M evaluations of typical {% if %} conditions, with the
+Interpreter and with the compiled closures, and the memory the
+intermediate values of one evaluation take, measured with tracemalloc.
+
+Usage: python -m benchmarks.bench_conditions [evaluations]
+"""
+import sys
+import time
+import tracemalloc
+
+from engine.evaluate import compile_expression
+
+CONDITIONS = [
+    ('comparison', 'post.id > 1', {'post.id': 21}),
+    ('arithmetic', 'post.id * 2 + 1 >= limit - 3', {'post.id': 21, 'limit': 40}),
+    ('logical', 'post.id > 1 AND post.id < 100 OR NOT draft', {'post.id': 21, 'draft': 0}),
+    ('string', 'name == "James" OR name == "Bob"', {'name': 'Bob'}),
+]
+
+# The peak of one evaluation is taken over this many evaluations
+TRACED_EVALUATIONS = 1000
+
+
+def timed(function, evaluations):
+    start = time.perf_counter()
+    for _ in range(evaluations):
+        function()
+    return time.perf_counter() - start
+
+
+def peak(function):
+    """
+    Highest memory taken by the values one call allocates, in bytes.
+    """
+    function()
+    tracemalloc.start()
+    highest = 0
+    for _ in range(TRACED_EVALUATIONS):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        function()
+        highest = max(highest, tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return highest
+
+
+def main(evaluations=1000000):
+    print(f"{'condition':<11} {'evaluator':<12} {'seconds':>8} {'us/eval':>8} {'peak (B)':>9}")
+    for name, text, bindings in CONDITIONS:
+        compiled = compile_expression(text)
+        for evaluator, function in (('interpreter', lambda: compiled.interpret(bindings)),
+                                    ('closures', lambda: compiled.evaluate(bindings))):
+            elapsed = timed(function, evaluations)
+            print(f'{name:<11} {evaluator:<12} {elapsed:>8.2f} {elapsed / evaluations * 1e6:>8.2f} '
+                  f'{peak(function):>9}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
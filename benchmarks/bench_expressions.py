@@ -0,0 +1,43 @@
+"""
+Compares the tree-walking Interpreter with the closure-compiled
+expressions on the grammar documented at the top of evaluate.py.
+
+Usage: python -m benchmarks.bench_expressions [iterations]
+"""
+import sys
+import timeit
+
+from engine.evaluate import compile_expression
+
+EXPRESSIONS = [
+    # arith-expr, term, factor, power
+    ('arith', '1 + 2 - 3', None),
+    ('term', '(2*5) + 2 / 4', None),
+    ('factor', '-(2 + 3) * +4', None),
+    ('power', '2 ^ 3 ^ 2', None),
+    # comp-expr
+    ('comparison', '10+10 * (4/2) == 10', None),
+    ('logical', '1 < 2 AND 3 >= 3 OR 0', None),
+    # atoms
+    ('string', 'name == "James"', {'name': 'James'}),
+    ('variables', 'post.id * 2 > limit', {'post.id': 21, 'limit': 40}),
+]
+
+
+def bench(function, iterations):
+    return min(timeit.repeat(function, number=iterations, repeat=5)) / iterations
+
+
+def main(iterations=20000):
+    print(f"{'expression':<12} {'interpreter (us)':>17} {'closures (us)':>14} {'speedup':>8}")
+    for name, text, bindings in EXPRESSIONS:
+        compiled = compile_expression(text)
+        assert compiled.evaluate(bindings) == compiled.interpret(bindings), text
+        
+        interpreted = bench(lambda: compiled.interpret(bindings), iterations)
+        closures = bench(lambda: compiled.evaluate(bindings), iterations)
+        print(f'{name:<12} {interpreted * 1e6:>17.2f} {closures * 1e6:>14.2f} {interpreted / closures:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,44 @@
+"""
+Throughput of engine.Lexer in MB/s on large generated HTML files.
+
+Usage: python -m benchmarks.bench_lexer [size_in_mb]
+"""
+import sys
+import time
+
+from engine.engine import Lexer
+
+# Markup-dense: a tag, variable or expression every ~10 characters
+DENSE_ROW = (
+    '<div class="row"><h2>{{ post.title }}</h2>'
+    '{% if post.id > 1 %}<p>{{ post.body }}</p>{% endif %}</div>\n'
+)
+# Text-heavy: long paragraphs with a few tags
+TEXT_ROW = '<p class="text">' + 'lorem ipsum dolor sit amet, consectetur adipiscing elit ' * 20 + '</p>\n'
+
+
+def make_template(row, size):
+    return '<html><body>{% for post in posts %}' + row * (size // len(row)) + '{% endfor %}</body></html>'
+
+
+def bench(template, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = Lexer(template).tokenize()
+        best = min(best, time.perf_counter() - start)
+    return best, len(tokens)
+
+
+def main(size_in_mb=5):
+    size = int(size_in_mb * 1000000)
+    print(f"{'template':<14} {'MB':>6} {'tokens':>9} {'seconds':>8} {'MB/s':>8}")
+    for name, row in (('markup-dense', DENSE_ROW), ('text-heavy', TEXT_ROW)):
+        template = make_template(row, size)
+        elapsed, tokens = bench(template)
+        megabytes = len(template) / 1000000
+        print(f'{name:<14} {megabytes:>6.1f} {tokens:>9} {elapsed:>8.3f} {megabytes / elapsed:>8.1f}')
+
+
+if __name__ == '__main__':
+    main(*map(float, sys.argv[1:]))
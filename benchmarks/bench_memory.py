@@ -0,0 +1,61 @@
+"""
+Memory retained by the tree of a parsed template: the node table the
+Parser builds against the nested {node: {child: {...}}} dicts and the
+{node: depth} map documents used to be made of, for templates of
+growing size (see generators.py).
+
+Usage: python -m benchmarks.bench_memory [tags ...]
+"""
+import sys
+import tracemalloc
+
+from engine.document import ROOT
+from engine.engine import Lexer, Parser
+
+from .generators import make_shape, make_template
+
+
+def to_dicts(table, index=ROOT, depth=None):
+    tree = {}
+    for child in table.children(index):
+        node = table.nodes[child]
+        tree[node] = to_dicts(table, child, depth)
+        depth[node] = table.depth[child]
+    return tree
+
+
+def retained(build):
+    """
+    Size of what build returns, measured with tracemalloc.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def copy_table(table):
+    copied = type(table)()
+    for column in table.__slots__:
+        setattr(copied, column, getattr(table, column)[:])
+    return copied
+
+
+def main(*sizes):
+    print(f"{'tags':>6} {'nodes':>8} {'table (KB)':>11} {'dicts (KB)':>11} {'ratio':>6}")
+    for tags in sizes or (100, 1000, 10000):
+        source = make_template(**make_shape(tags=tags, depth=8))
+        tokens = Lexer(source).tokenize()
+        table = Parser(tokens, source).parse(tokens).table
+
+        # Node objects are shared by both trees, only their structure is measured
+        _, table_size = retained(lambda: copy_table(table))
+        _, dicts_size = retained(lambda: (to_dicts(table, depth=(depth := {})), depth))
+        print(f'{tags:>6} {len(table):>8} {table_size / 1e3:>11.1f} {dicts_size / 1e3:>11.1f} '
+              f'{dicts_size / table_size:>6.1f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
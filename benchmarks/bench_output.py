@@ -0,0 +1,33 @@
+"""
+Build time, render time and size of the output of a synthetic page in
+each output mode (see engine.utils.OUTPUT_MODES), with the Interpreter
+and with the compiled render function. The build covers tokenizing,
+parsing and optimizing the template.
+
+Usage: python -m benchmarks.bench_output [tags] [loop_length]
+"""
+import sys
+import timeit
+
+from engine.engine import Template
+from engine.utils import OUTPUT_MODES
+
+from .generators import make_context, make_shape, make_template
+
+
+def main(tags=50, loop_length=100):
+    shape = make_shape(tags=tags, loop_length=loop_length, depth=4)
+    source, context = make_template(**shape), make_context(**shape)
+    print(f'template: {len(source)} bytes')
+    print(f"{'mode':<9} {'renderer':<12} {'build (ms)':>11} {'render (ms)':>12} {'output (KB)':>12}")
+    for mode in OUTPUT_MODES:
+        build = min(timeit.repeat(lambda: Template(source, mode=mode), number=5, repeat=5)) / 5
+        for renderer, compiled in (('interpreter', False), ('compiled', True)):
+            template = Template(source, compiled=compiled, mode=mode)
+            elapsed = min(timeit.repeat(lambda: template.render(context), number=5, repeat=5)) / 5
+            size = len(template.render(context).encode('utf-8'))
+            print(f'{mode:<9} {renderer:<12} {build * 1e3:>11.2f} {elapsed * 1e3:>12.2f} {size / 1e3:>12.1f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
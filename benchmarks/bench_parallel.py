@@ -0,0 +1,63 @@
+"""
+Speedup of engine.parallel.render_many against the number of workers,
+rendering one email template per user.
+
+Usage: python -m benchmarks.bench_parallel [contexts] [max_workers]
+"""
+import os
+import sys
+import time
+
+from engine.engine import Template
+from engine.parallel import render_many
+
+EMAIL = """<html>
+<body>
+    <h1>Hello {{ user.name }}</h1>
+    {% if user.unread > 0 %}
+    <p>You have {{ user.unread }} unread messages.</p>
+    {% else %}
+    <p>No new messages.</p>
+    {% endif %}
+    <ul>
+        {% for post in user.posts %}
+        <li><h2>{{ post.title }}</h2><p>{{ post.body }}</p></li>
+        {% endfor %}
+    </ul>
+</body>
+</html>"""
+
+
+def make_contexts(count):
+    for index in range(count):
+        yield {'user': {
+            'name': f'user {index}',
+            'unread': index % 4,
+            'posts': [{'title': f'post {i}', 'body': 'lorem ipsum dolor sit amet ' * 10} for i in range(20)],
+        }}
+
+
+def main(count=20000, max_workers=os.cpu_count()):
+    template = Template(EMAIL, compiled=True)
+    
+    start = time.perf_counter()
+    for context in make_contexts(count):
+        template.render(context)
+    serial = time.perf_counter() - start
+    
+    print(f'{os.cpu_count()} cpus, {count} contexts')
+    print(f"{'workers':>8} {'seconds':>8} {'speedup':>8}")
+    print(f"{'serial':>8} {serial:>8.3f} {1:>7.2f}x")
+    
+    workers = 1
+    while workers <= max_workers:
+        start = time.perf_counter()
+        for _ in render_many(template, make_contexts(count), workers=workers, chunksize=256):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f'{workers:>8} {elapsed:>8.3f} {serial / elapsed:>7.2f}x')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,42 @@
+"""
+Scaling of engine.Parser from 1k to 1M tokens, the rows being wrapped
+in depth nested divs. The time per token should stay flat as the
+template grows, whatever its depth.
+
+Usage: python -m benchmarks.bench_parser [max_tokens] [depth]
+"""
+import sys
+import time
+
+from engine.engine import Lexer, Parser
+
+ROW = (
+    '<div class="row"><h2>{{ post.title }}</h2>'
+    '{% if post.id > 1 %}<p>{{ post.body }}</p>{% endif %}</div>\n'
+)
+TOKENS_PER_ROW = 10
+
+
+def make_template(tokens, depth=0):
+    rows = max(tokens // TOKENS_PER_ROW, 1)
+    body = '{% for post in posts %}' + ROW * rows + '{% endfor %}'
+    return '<html><body>' + '<div>' * depth + body + '</div>' * depth + '</body></html>'
+
+
+def main(max_tokens=1000000, depth=0):
+    print(f"{'tokens':>9} {'size (MB)':>10} {'parse (s)':>10} {'us/token':>9}")
+    size = 1000
+    while size <= max_tokens:
+        template = make_template(size, depth)
+        tokens = Lexer(template).tokenize()
+        
+        start = time.perf_counter()
+        Parser(tokens, template).parse(tokens)
+        elapsed = time.perf_counter() - start
+        
+        print(f'{len(tokens):>9} {len(template) / 1e6:>10.1f} {elapsed:>10.4f} {elapsed / len(tokens) * 1e6:>9.2f}')
+        size *= 10
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
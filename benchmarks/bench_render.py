@@ -0,0 +1,53 @@
+"""
+Render time and peak memory of a page whose loop renders 50k rows,
+with the Interpreter and with the compiled render function.
+
+Usage: python -m benchmarks.bench_render [rows]
+"""
+import sys
+import time
+import tracemalloc
+
+from engine.engine import Template
+
+PAGE = """<html>
+<body>
+    <h1>{{ title }}</h1>
+    <table>
+        {% for row in rows %}
+        <tr><td>{{ row.id }}</td><td>{{ row.name }}</td><td>{{ row.email }}</td></tr>
+        {% endfor %}
+    </table>
+</body>
+</html>"""
+
+
+def make_context(rows):
+    return {
+        'title': 'Report',
+        'rows': [{'id': i, 'name': f'user {i}', 'email': f'user{i}@example.com'} for i in range(rows)],
+    }
+
+
+def measure(template, context):
+    start = time.perf_counter()
+    result = template.render(context)
+    elapsed = time.perf_counter() - start
+    
+    tracemalloc.start()
+    template.render(context)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, len(result)
+
+
+def main(rows=50000):
+    context = make_context(rows)
+    print(f"{'renderer':<12} {'rows':>7} {'seconds':>8} {'output (MB)':>12} {'peak (MB)':>10}")
+    for name, compiled in (('interpreter', False), ('compiled', True)):
+        elapsed, peak, size = measure(Template(PAGE, compiled=compiled), context)
+        print(f'{name:<12} {rows:>7} {elapsed:>8.3f} {size / 1e6:>12.2f} {peak / 1e6:>10.2f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
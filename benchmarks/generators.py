@@ -0,0 +1,69 @@
+"""
+Synthetic templates and contexts whose shape can be scaled one
+dimension at a time:
+
+    tags        sibling blocks inside the loop body
+    depth       nesting depth of each block
+    variables   {{ item.field_N }} per block
+    branches    if/elif branches per block (0 for none)
+    loop_length items the for loop iterates over
+    data_size   extra records in the context, never rendered
+"""
+
+SHAPE = {
+    'tags': 10,
+    'depth': 2,
+    'variables': 2,
+    'branches': 1,
+    'loop_length': 10,
+    'data_size': 10,
+}
+
+
+def make_block(index, depth, variables, branches):
+    fields = ' '.join(f'{{{{ item.field_{field} }}}}' for field in range(variables))
+    block = f'<p class="block-{index}">{fields}</p>'
+
+    if branches:
+        chain = ['{% if item.id == 0 %}<span>branch 0</span>']
+        chain += [f'{{% elif item.id == {branch} %}}<span>branch {branch}</span>' for branch in range(1, branches)]
+        chain.append('{% else %}<span>other</span>{% endif %}')
+        block += ''.join(chain)
+
+    for level in range(depth - 1):
+        block = f'<div class="level-{level}">{block}</div>'
+    return block
+
+
+def make_template(tags=SHAPE['tags'], depth=SHAPE['depth'], variables=SHAPE['variables'],
+                  branches=SHAPE['branches'], **_):
+    body = '\n'.join(make_block(index, depth, variables, branches) for index in range(tags))
+    return (
+        '<html>\n<body>\n<h1>{{ title }}</h1>\n'
+        '{% for item in items %}\n' + body + '\n{% endfor %}\n'
+        '</body>\n</html>'
+    )
+
+
+def make_context(variables=SHAPE['variables'], loop_length=SHAPE['loop_length'],
+                 data_size=SHAPE['data_size'], **_):
+    context = {
+        'title': 'Benchmark',
+        'items': [
+            dict({'id': item}, **{f'field_{field}': f'value {item}.{field}' for field in range(variables)})
+            for item in range(loop_length)
+        ],
+    }
+    for record in range(data_size):
+        context[f'data_{record}'] = {'id': record, 'name': f'record {record}', 'tags': ['a', 'b', 'c']}
+    return context
+
+
+def make_shape(**overrides):
+    """
+    Default SHAPE with some dimensions changed, unknown names are rejected.
+    """
+    unknown = set(overrides) - set(SHAPE)
+    if unknown:
+        raise ValueError(f'Unknown shape dimensions: {", ".join(sorted(unknown))}')
+    return dict(SHAPE, **overrides)
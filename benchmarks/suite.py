@@ -0,0 +1,218 @@
+"""
+Times each stage of the engine (Lexer.tokenize, Parser.parse, Interpreter
+on the optimized document, evaluate.evaluate) on synthetic templates,
+scaling one dimension of their shape at a time (see generators.py).
+Reports the median and percentiles of each stage and can write them as
+JSON to compare commits.
+
+Usage:
+    python -m benchmarks.suite [--repeat N] [--dimension NAME ...]
+                               [--output results.json]
+                               [--compare baseline.json] [--threshold 0.1]
+
+With --compare, stages whose median got slower than the baseline by more
+than the threshold are listed and the exit status is 1.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from engine.document import Expression
+from engine.engine import Interpreter, Lexer, Parser
+from engine.evaluate import compile_expression, evaluate
+from engine.optimizer import optimize
+from engine.utils import compile_path
+
+from .generators import SHAPE, make_context, make_shape, make_template
+
+SWEEPS = {
+    'tags': [10, 100, 1000],
+    'depth': [2, 8, 32],
+    'variables': [2, 16, 64],
+    'branches': [1, 8, 32],
+    'loop_length': [10, 100, 1000],
+    'data_size': [10, 1000, 100000],
+}
+
+STAGES = ['tokenize', 'parse', 'interpreter', 'evaluate']
+
+# Calls are batched so that one sample lasts at least this long
+MIN_SAMPLE_TIME = 0.001
+
+
+### STATISTICS ###
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples):
+    return {
+        'samples': len(samples),
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'p90': percentile(samples, 0.90),
+        'p99': percentile(samples, 0.99),
+        'max': max(samples),
+    }
+
+
+def measure(function, repeat):
+    """
+    Seconds per call of function, one value per sample.
+    """
+    start = time.perf_counter()
+    function()
+    number = max(1, int(MIN_SAMPLE_TIME / max(time.perf_counter() - start, 1e-9)))
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+### STAGES ###
+
+def get_conditions(table):
+    for index in table.walk():
+        node = table.nodes[index]
+        if isinstance(node, Expression) and node.command in ('if', 'elif'):
+            yield node.expression_content
+
+
+def bench_shape(shape, repeat):
+    source = make_template(**shape)
+    context = make_context(**shape)
+
+    tokens = Lexer(source).tokenize()
+    document = Parser(tokens, source).parse(tokens)
+    # Templates render their optimized document
+    optimized = optimize(document)
+
+    # The evaluate stage runs every condition of the template once per loop item,
+    # with the bindings the Interpreter would pass
+    calls = []
+    for condition in get_conditions(document.table):
+        names = compile_expression(condition).names
+        for item in context['items']:
+            item_context = {'item': item}
+            calls.append((condition, {name: compile_path(name)(item_context) for name in names}))
+
+    def evaluate_conditions():
+        for condition, bindings in calls:
+            evaluate(condition, bindings)
+
+    stages = {
+        'tokenize': lambda: Lexer(source).tokenize(),
+        'parse': lambda: Parser(tokens, source).parse(tokens),
+        'interpreter': lambda: Interpreter(optimized, context),
+        'evaluate': evaluate_conditions,
+    }
+    return {
+        'shape': shape,
+        'template_size': len(source),
+        'tokens': len(tokens),
+        'conditions': len(calls),
+        'stages': {name: summarize(measure(stages[name], repeat)) for name in STAGES},
+    }
+
+
+def get_scenarios(dimensions):
+    yield 'baseline', make_shape()
+    for dimension in dimensions:
+        for value in SWEEPS[dimension]:
+            if value != SHAPE[dimension]:
+                yield f'{dimension}={value}', make_shape(**{dimension: value})
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(dimensions=tuple(SWEEPS), repeat=20, report=print):
+    results = {
+        'meta': {
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'repeat': repeat,
+        },
+        'scenarios': {},
+    }
+
+    report(f"{'scenario':<20} " + ' '.join(f'{stage + " (ms)":>17}' for stage in STAGES))
+    for name, shape in get_scenarios(dimensions):
+        result = bench_shape(shape, repeat)
+        results['scenarios'][name] = result
+        report(f'{name:<20} ' + ' '.join(
+            f"{result['stages'][stage]['median'] * 1e3:>17.3f}" for stage in STAGES
+        ))
+    return results
+
+
+### REGRESSIONS ###
+
+def compare(results, baseline, threshold=0.1):
+    """
+    (scenario, stage, ratio) of the stages whose median grew by more than threshold.
+    """
+    regressions = []
+    for name, result in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+        for stage, summary in result['stages'].items():
+            if stage not in previous['stages']:
+                continue
+            ratio = summary['median'] / previous['stages'][stage]['median']
+            if ratio > 1 + threshold:
+                regressions.append((name, stage, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=20, help='samples per stage')
+    parser.add_argument('--dimension', action='append', choices=list(SWEEPS),
+                        help='only sweep this dimension (repeatable)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown of the median counted as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.dimension or tuple(SWEEPS), args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, stage, ratio in regressions:
+            print(f'REGRESSION {name} {stage}: {ratio:.2f}x slower than {baseline["meta"].get("commit")}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
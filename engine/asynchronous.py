@@ -0,0 +1,165 @@
+import asyncio
+import inspect
+import io
+
+from .document import EXPRESSION_NODE, OUTPUT_NODE, ROOT, STATIC_NODE
+from .engine import (DEFAULT_FLUSH_SIZE, RENDER_CHILDREN, RENDER_FRAGMENT, RENDER_LOOP,
+                     ChunkStripper, Interpreter, RenderFrame, Template, get_compiled_template)
+from .utils import VERBATIM
+
+# A for loop gives control back to the event loop every LOOP_YIELD_INTERVAL iterations
+LOOP_YIELD_INTERVAL = 100
+
+# Chunks waiting to be consumed before the renderer pauses
+QUEUE_SIZE = 4
+
+END_OF_STREAM = object()
+
+
+async def resolve_context(context):
+    """
+    Awaits every awaitable value of the context, nested dicts included,
+    concurrently. Async iterables are left as they are, for loops
+    consume them lazily.
+    """
+    resolved = dict(context)
+    keys, awaitables = [], []
+
+    for key, value in context.items():
+        if inspect.isawaitable(value):
+            keys.append(key)
+            awaitables.append(value)
+        elif isinstance(value, dict):
+            keys.append(key)
+            awaitables.append(resolve_context(value))
+
+    for key, value in zip(keys, await asyncio.gather(*awaitables)):
+        resolved[key] = value
+    return resolved
+
+
+async def iterate(iterable):
+    """
+    Items of a plain or an async iterable.
+    """
+    if hasattr(iterable, '__aiter__'):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+class AsyncInterpreter(Interpreter):
+    """
+    Interpreter whose expressions and loops are coroutines.
+
+    Loops accept async iterables and hand control back to the event loop
+    every LOOP_YIELD_INTERVAL iterations. The output buffer is flushed to
+    a queue after each top-level node and loop iteration once it holds
+    flush_size characters.
+    """
+    def __init__(self, document, flush_size=DEFAULT_FLUSH_SIZE) -> None:
+        self.document = document
+        self.table = document.table
+        self.nodes = self.table.nodes
+        self.flush_size = flush_size
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.buffer = None
+
+    async def flush(self, frame, force=False):
+        if frame.buffer is not self.buffer:
+            # Inside a {% cache %} block, kept until the fragment is complete
+            return
+        if force or frame.buffer.tell() >= self.flush_size:
+            chunk = frame.buffer.getvalue()
+            frame.buffer.seek(0)
+            frame.buffer.truncate()
+            if chunk:
+                await self.queue.put(chunk)
+
+    async def visit_loop(self, index, frame, looped_var, iterable_var):
+        loop_frame = frame.child(None)
+        count = 0
+
+        async for iterable in iterate(iterable_var):
+            loop_frame.context = {looped_var: iterable}
+            await self.render(index, loop_frame)
+            await self.flush(loop_frame)
+
+            count += 1
+            if count % LOOP_YIELD_INTERVAL == 0:
+                await asyncio.sleep(0)
+
+    async def visit_expression(self, index, frame, is_matched=False):
+        action, argument, is_matched = self.dispatch_expression(index, frame, is_matched)
+        if action == RENDER_CHILDREN:
+            await self.render(index, frame)
+        elif action == RENDER_LOOP:
+            await self.visit_loop(index, frame, *argument)
+        elif action == RENDER_FRAGMENT:
+            await self.visit_fragment(index, frame, *argument)
+        return is_matched
+
+    async def visit_fragment(self, index, frame, key, ttl):
+        fragment_frame = RenderFrame(frame.context, io.StringIO())
+        await self.render(index, fragment_frame)
+        self.store_fragment(frame, fragment_frame, key, ttl)
+
+    async def render(self, index, frame, flush=False):
+        is_matched = False
+        kinds = self.table.kinds
+
+        for child in self.table.children(index):
+            kind = kinds[child]
+            if kind == EXPRESSION_NODE:
+                is_matched = await self.visit_expression(child, frame, is_matched)
+            elif kind == STATIC_NODE:
+                frame.write(self.nodes[child].text)
+                is_matched = False
+            elif kind == OUTPUT_NODE:
+                frame.write(self.visit_variable(self.nodes[child].name, frame))
+                is_matched = False
+
+            if flush:
+                await self.flush(frame)
+
+    async def render_document(self, context):
+        try:
+            self.buffer = io.StringIO()
+            frame = RenderFrame(await resolve_context(context), self.buffer)
+            await self.render(ROOT, frame, flush=True)
+            await self.flush(frame, force=True)
+        except Exception:
+            # The error is raised to the consumer when it awaits the task
+            await self.queue.put(END_OF_STREAM)
+            raise
+        await self.queue.put(END_OF_STREAM)
+
+    async def stream(self, context):
+        stripper = None if self.document.mode == VERBATIM else ChunkStripper()
+        task = asyncio.ensure_future(self.render_document(context))
+        try:
+            while True:
+                chunk = await self.queue.get()
+                if chunk is END_OF_STREAM:
+                    break
+                text = stripper.feed(chunk) if stripper else chunk
+                if text:
+                    yield text
+            await task
+        finally:
+            task.cancel()
+
+
+def render_async_stream(template, context, flush_size=DEFAULT_FLUSH_SIZE):
+    """
+    Async generator of the rendered document's chunks.
+    """
+    if not isinstance(template, Template):
+        template = get_compiled_template(template)
+    return AsyncInterpreter(template.optimized, flush_size).stream(context)
+
+
+async def render_async(template, context):
+    return ''.join([chunk async for chunk in render_async_stream(template, context)])
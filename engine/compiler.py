@@ -0,0 +1,299 @@
+import io
+
+from .document import (EXPRESSION_NODE, OUTPUT_NODE, ROOT, STATIC_NODE, RetrieveVarsFromExpression,
+                       evaluate_condition)
+from .fragments import (get_fragment, make_fragment_key, parse_cache_arguments,
+                        set_fragment)
+from .utils import VERBATIM, compile_path, get_indentation, get_string_literal
+
+
+### RUNTIME HELPERS ###
+
+# The generated render function only calls the helpers below and the
+# compiled path resolvers (_path_0, _path_1...) of the variables it reads,
+# everything else (markup, indentation, branches, loops) is inlined.
+
+def resolve_condition(context, expression):
+    return evaluate_condition(expression, context)
+
+
+def resolve_include(name, context, indentation, mode, loader):
+    # engine imports the compiler, the include machinery lives there
+    from .engine import render_include
+    return render_include(name, context, indentation, compiled=True, mode=mode, loader=loader)
+
+
+def resolve_counted_condition(context, expression, counters):
+    counters['expression_evaluations'] += 1
+    return evaluate_condition(expression, context)
+
+
+RUNTIME = {
+    '_condition': resolve_condition,
+    '_StringIO': io.StringIO,
+    '_include': resolve_include,
+    '_fragment_key': make_fragment_key,
+    '_get_fragment': get_fragment,
+    '_set_fragment': set_fragment,
+}
+
+
+### COMPILER ###
+
+class Compiler:
+    """
+    Turns an optimized Document (see optimizer.py) into the Python
+    source of a single render(context) function, then compiles it once.
+
+    Static markup becomes constant strings, for blocks become
+    native loops and if/elif/else chains native branches.
+    Produces the same output as engine.Interpreter.
+    
+    A second, streaming variant of the function is generated as well:
+    stream(context, _out) writes to _out and yields after each top-level
+    node and each for iteration so the caller can flush the buffer.
+    
+    compile_counting() generates a third variant, render(context, _counters),
+    which also fills the instrumentation counters.
+    """
+    def __init__(self, document, name=None) -> None:
+        self.document = document
+        self.name = name or '<template>'
+        self.table = document.table
+
+        self.lines = []
+        self.pending = []
+        self.indentation = 1
+        self.loop_count = 0
+        self.fragment_count = 0
+        self.streaming = False
+        self.counting = False
+        self.paths = {}
+
+    def write_line(self, line):
+        self.lines.append('    ' * self.indentation + line)
+
+    def write_static(self, text):
+        if text:
+            self.pending.append(text)
+
+    def write_count(self, counter):
+        if self.counting:
+            self.write_line(f'_counters[{counter!r}] += 1')
+
+    def write_flush_point(self):
+        if self.streaming:
+            self.flush_static()
+            self.write_line('yield')
+
+    def write_block(self, index, flush=False):
+        self.indentation += 1
+        line_count = len(self.lines)
+        self.visit(index)
+        if flush:
+            self.write_flush_point()
+        self.flush_static()
+        if len(self.lines) == line_count:
+            self.write_line('pass')
+        self.indentation -= 1
+
+    def flush_static(self):
+        if self.pending:
+            self.write_line(f"_write({''.join(self.pending)!r})")
+            self.pending = []
+
+    def get_path(self, path):
+        """
+        Name of the compiled path resolver, bound in the function's globals.
+        """
+        if path not in self.paths:
+            self.paths[path] = f'_path_{len(self.paths)}'
+        return self.paths[path]
+
+    def visit_variable(self, name):
+        retriever = RetrieveVarsFromExpression('Variable', name, {})
+        path = retriever.assumed_vars[0]
+
+        if retriever.is_string(path) or retriever.is_mathematical_expression(path):
+            self.write_static(path)
+        else:
+            self.flush_static()
+            self.write_count('variable_lookups')
+            self.write_line(f'_write(str({self.get_path(path)}(context)))')
+
+    def visit_for(self, index):
+        expression = self.table.nodes[index]
+        loop_var, logical_operator, iterable_var = expression.expression_content.split()
+
+        if logical_operator != 'in':
+            raise SyntaxError(f"Expected 'in' keyword, got {logical_operator}")
+
+        self.loop_count += 1
+        saved_context = f'_context_{self.loop_count}'
+        item = f'_item_{self.loop_count}'
+
+        self.flush_static()
+        self.write_count('variable_lookups')
+        self.write_line(f'{saved_context} = context')
+        self.write_line(f'for {item} in {self.get_path(iterable_var)}(context):')
+        self.indentation += 1
+        self.write_line(f'context = {{{loop_var!r}: {item}}}')
+        self.write_count('loop_iterations')
+        self.indentation -= 1
+        self.write_block(index, flush=True)
+        self.write_line(f'context = {saved_context}')
+
+    def visit_include(self, index, flush=False):
+        expression = self.table.nodes[index]
+        if get_string_literal(expression.expression_content) is not None:
+            # Inlined when the template was built
+            self.visit(index, flush)
+            return
+
+        indentation = get_indentation(self.table.depth[index], self.document.mode)
+        path = self.get_path(expression.expression_content)
+        self.flush_static()
+        self.write_line(f'_write(_include({path}(context), context, {indentation!r}, {self.document.mode!r}, _loader))')
+
+    def visit_cache(self, index):
+        expression = self.table.nodes[index]
+        name, variables, ttl = parse_cache_arguments(expression.expression_content)
+        values = ', '.join(f'{self.get_path(variable)}(context)' for variable in variables)
+
+        self.fragment_count += 1
+        fragment = f'_fragment_{self.fragment_count}'
+        key = f'_fragment_key_{self.fragment_count}'
+        saved_write = f'_write_{self.fragment_count}'
+
+        # On a miss the block is rendered into its own buffer, then stored
+        self.flush_static()
+        scope = self.document.fragment_scope
+        self.write_line(f'{key} = _fragment_key({scope!r}, {name!r}, ({values}{"," if variables else ""}))')
+        self.write_line(f'{fragment} = _get_fragment({key})')
+        self.write_line(f'if {fragment} is None:')
+        self.indentation += 1
+        self.write_line(f'{saved_write}, {fragment} = _write, _StringIO()')
+        self.write_line(f'_write = {fragment}.write')
+        self.visit(index)
+        self.flush_static()
+        self.write_line(f'_write, {fragment} = {saved_write}, {fragment}.getvalue()')
+        self.write_line(f'_set_fragment({key}, {fragment}, {ttl!r})')
+        self.indentation -= 1
+        self.write_line(f'_write({fragment})')
+
+    def visit_branch(self, keyword, index):
+        expression = self.table.nodes[index]
+        self.flush_static()
+        if keyword == 'else':
+            self.write_line('else:')
+        else:
+            counters = ', _counters' if self.counting else ''
+            self.write_line(f'{keyword} _condition(context, {expression.expression_content!r}{counters}):')
+
+        self.write_block(index)
+
+    def visit(self, index, flush=False):
+        """
+        Generates the code of the children of the node at index.
+        """
+        table = self.table
+        in_chain = False
+        for child in table.children(index):
+            kind = table.kinds[child]
+            node = table.nodes[child]
+            continues_chain = in_chain and kind == EXPRESSION_NODE and \
+                node.command in ('elif', 'else')
+            if flush and not continues_chain:
+                self.write_flush_point()
+            
+            if kind == STATIC_NODE:
+                in_chain = False
+                self.write_static(node.text)
+
+            elif kind == OUTPUT_NODE:
+                in_chain = False
+                self.visit_variable(node.name)
+
+            elif kind == EXPRESSION_NODE:
+                expression_command = node.command
+
+                if expression_command == 'for':
+                    in_chain = False
+                    self.visit_for(child)
+
+                elif expression_command == 'cache':
+                    in_chain = False
+                    self.visit_cache(child)
+
+                elif expression_command == 'block':
+                    in_chain = False
+                    self.visit(child, flush)
+
+                elif expression_command == 'include':
+                    in_chain = False
+                    self.visit_include(child, flush)
+
+                elif expression_command == 'extends':
+                    # Resolved when the template was built
+                    in_chain = False
+
+                elif expression_command == 'if' or not in_chain:
+                    in_chain = expression_command != 'else'
+                    if expression_command == 'else':
+                        self.visit(child)
+                    else:
+                        self.visit_branch('if', child)
+
+                elif expression_command == 'elif':
+                    self.visit_branch('elif', child)
+
+                elif expression_command == 'else':
+                    in_chain = False
+                    self.visit_branch('else', child)
+
+                else:
+                    raise ValueError(f"Invalid expression command: {expression_command}")
+
+    def generate(self, streaming=False, counting=False):
+        self.streaming = streaming
+        self.counting = counting
+        self.loop_count = 0
+        self.fragment_count = 0
+        
+        if streaming:
+            self.lines = ['def stream(context, _out):', '    _write = _out.append']
+        elif counting:
+            self.lines = ['def render(context, _counters):', '    _out = _StringIO()', '    _write = _out.write']
+        else:
+            self.lines = ['def render(context):', '    _out = _StringIO()', '    _write = _out.write']
+        
+        self.visit(ROOT, flush=True)
+        self.flush_static()
+        
+        if streaming:
+            self.write_line('yield')
+        else:
+            self.write_line("return _out.getvalue()" if self.document.mode == VERBATIM else "return _out.getvalue().strip()")
+        return '\n'.join(self.lines) + '\n'
+
+    def build(self, streaming=False, counting=False):
+        source = self.generate(streaming, counting)
+        namespace = dict(RUNTIME)
+        namespace['_loader'] = self.document.loader
+        if counting:
+            namespace['_condition'] = resolve_counted_condition
+        namespace.update((name, compile_path(path)) for path, name in self.paths.items())
+        exec(compile(source, self.name, 'exec'), namespace)
+        
+        function = namespace['stream' if streaming else 'render']
+        function.source = source
+        return function
+
+    def compile(self):
+        """
+        Returns the (render, stream) pair of functions.
+        """
+        return self.build(), self.build(streaming=True)
+
+    def compile_counting(self):
+        return self.build(counting=True)
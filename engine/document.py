@@ -1,76 +1,229 @@
 import pprint
-import re
+from array import array
 
-from .evaluate import evaluate
-from .utils import SELF_CLOSING_TAGS, RetrieveVarsFromExpression
+from .evaluate import compile_expression
+from .fragments import make_fragment_scope, parse_cache_arguments
+from .utils import (PRETTY, SELF_CLOSING_TAGS, VARIABLE_PATTERN, RetrieveVarsFromExpression,
+                    compile_path, get_string_literal)
+
+
+def evaluate_condition(expression, context):
+    """
+    Evaluates an if/elif condition against the context.
+    The condition is only parsed once, variables are passed as bindings.
+    """
+    compiled = compile_expression(expression)
+    retriever = RetrieveVarsFromExpression('if', expression, context)
+    bindings = {name: retriever.lookup(name) for name in compiled.names}
+    return True if compiled.evaluate(bindings) else False
+
+
+### NODE TABLE ###
+
+ROOT_NODE, TAG_NODE, VARIABLE_NODE, EXPRESSION_NODE, STATIC_NODE, OUTPUT_NODE = range(6)
+
+ROOT = 0
+NO_NODE = -1
+
+
+class NodeTable:
+    """
+    The nodes of a document in flat parallel arrays, indexed by node id.
+    Node 0 is the root of the document.
+    
+    Children are linked through first_child and next_sibling, so the
+    parent, children and depth of a node are each O(1) to reach and
+    nothing is nested. The Tag/Variable/Expression objects only hold
+    what the node is, their position in the document lives here:
+    a node object can appear in several tables (a parent template and
+    the ones extending it) at different depths.
+    
+    Columns are lists while the table is built, appending to them is
+    about twice as fast, and packed into 4-byte arrays by freeze().
+    """
+    __slots__ = ('nodes', 'kinds', 'parent', 'first_child', 'last_child',
+                 'next_sibling', 'depth', 'start', 'end')
+    
+    COLUMNS = __slots__[1:]
+    
+    def __init__(self) -> None:
+        self.nodes = [None]
+        self.kinds = [ROOT_NODE]
+        self.parent = [NO_NODE]
+        self.first_child = [NO_NODE]
+        self.last_child = [NO_NODE]
+        self.next_sibling = [NO_NODE]
+        self.depth = [0]
+        self.start = [0]
+        self.end = [0]
+    
+    def freeze(self):
+        """
+        Packs the columns into arrays, rows can still be added after.
+        """
+        for column in self.COLUMNS:
+            values = getattr(self, column)
+            if isinstance(values, list):
+                setattr(self, column, array('b' if column == 'kinds' else 'i', values))
+        return self
+    
+    def add(self, node, parent=ROOT):
+        """
+        Appends node as the last child of parent, returns its index.
+        """
+        index = len(self.nodes)
+        self.nodes.append(node)
+        self.kinds.append(NODE_KINDS[type(node)])
+        self.parent.append(parent)
+        self.first_child.append(NO_NODE)
+        self.last_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self.depth.append(self.depth[parent] + 1)
+        self.start.append(node.start)
+        self.end.append(node.end)
+        
+        previous = self.last_child[parent]
+        if previous == NO_NODE:
+            self.first_child[parent] = index
+        else:
+            self.next_sibling[previous] = index
+        self.last_child[parent] = index
+        return index
+    
+    def children(self, index=ROOT):
+        child = self.first_child[index]
+        next_sibling = self.next_sibling
+        while child != NO_NODE:
+            yield child
+            child = next_sibling[child]
+    
+    def has_children(self, index):
+        return self.first_child[index] != NO_NODE
+    
+    def walk(self, index=ROOT):
+        """
+        Every descendant of index, in document order.
+        """
+        first_child, next_sibling, parent = self.first_child, self.next_sibling, self.parent
+        node = first_child[index]
+        while node != NO_NODE:
+            yield node
+            if first_child[node] != NO_NODE:
+                node = first_child[node]
+                continue
+            while node != index and next_sibling[node] == NO_NODE:
+                node = parent[node]
+            node = NO_NODE if node == index else next_sibling[node]
+    
+    def __len__(self):
+        return len(self.nodes) - 1
 
 
 class Document:
-    def __init__(self, template) -> None:
+    def __init__(self, template, mode=PRETTY, name=None, loader=None) -> None:
         self.template = template
-        self.tree = dict()
+        self.name = name
+        # Loader of the templates it includes by a dynamic name,
+        # None for the global one
+        self.loader = loader
+        self.table = NodeTable()
         self.var_replacement = 0
-        
-    def build_document(self, children=None):
-        if children is None:
-            children = self.tree
-            
-        for parent, children in children.items():
-            parent.content = children
-            if children:
-                self.build_document(children)
-            else:
-                continue
+        # Output mode the document renders in, see utils.OUTPUT_MODES
+        self.mode = mode
+        self._fragment_scope = None
+    
+    @property
+    def fragment_scope(self):
+        """
+        Prefix of the keys of the document's {% cache %} fragments.
+        """
+        if self._fragment_scope is None:
+            self._fragment_scope = make_fragment_scope(self.name, self.template, self.mode)
+        return self._fragment_scope
+    
+    def to_nested(self, index=ROOT):
+        """
+        (node, children) pairs of the subtree of index, for display.
+        """
+        table = self.table
+        return [(table.nodes[child], self.to_nested(child)) for child in table.children(index)]
                                                     
     def prettify(self):
-        return pprint.pformat(self.tree)
+        return pprint.pformat(self.to_nested())
         
         
 class Tag:
+    """
+    The inner text is not copied out of the template: the tag keeps a
+    reference to the source and the offsets of the text between its
+    opening and closing tags, sliced the first time it is read.
+    Tags containing other tags or expressions have no inner text,
+    their content renders through their children.
+    """
     def __init__(self, 
                  name, 
                  start, 
                  end, 
-                 inner_text,
-                 content=dict(), 
                  html_attrs=list(), 
+                 source='',
         ) -> None:
         
         self.name = name
         self.start = start
         self.end = end
-        self.content = content
-        self.inner_text = self.remove_tags(inner_text)
         self.html_attrs = html_attrs
+        self.source = source
+        self.text_span = None
+        self._inner_text = None
+        self.inner_text_parts = None
+        self.opening_text = None
+        self.closing_text = None
     
-    def get_html_tag_name(token):
-        return re.findall(r'\w+', token.content)[0]
-
-    def get_html_attributes(token):
-        return re.findall(
-            r"""([^\s]+-?\w+)=["']?((?:.(?!["']?\s+(?:\S+)=|\s*\/?[>"']))+.)["']?""", 
-            token.content
-            )
-    
-    def remove_tags(self, inner_text):
-        cleaner = re.compile(r'<[^>]+>')
-        all_inner_tags = re.findall(cleaner, inner_text)
-        is_nested = len(all_inner_tags) > 2
-        if not is_nested:
-            cleaned_string = cleaner.sub('', inner_text).strip()
-            return cleaned_string
-        
-        return ''
+    def set_text_span(self, start, end):
+        self.text_span = (start, end)
+        self._inner_text = self.inner_text_parts = None
+    
+    @property
+    def inner_text(self):
+        if self._inner_text is None:
+            if self.text_span is None:
+                self._inner_text = ''
+            else:
+                start, end = self.text_span
+                self._inner_text = self.source[start:end].strip()
+        return self._inner_text
+    
+    @property
+    def raw_inner_text(self):
+        """
+        The inner text as written in the template, whitespace included.
+        """
+        if self.text_span is None:
+            return ''
+        start, end = self.text_span
+        return self.source[start:end]
+            
+    def get_inner_text_parts(self):
+        """
+        The inner text split around its {{ variables }}: static text
+        at even positions, variable names at odd positions.
+        """
+        if self.inner_text_parts is None:
+            self.inner_text_parts = VARIABLE_PATTERN.split(self.inner_text)
+        return self.inner_text_parts
             
     def opening(self):
-        if self.html_attrs: 
-            return f'''<{self.name} {' '.join(a[0] + '=' + '"' + a[1] + '"' for a in self.html_attrs)}>'''
-        return f"<{self.name}>"
+        if self.opening_text is None:
+            if self.html_attrs: 
+                self.opening_text = f'''<{self.name} {' '.join(a[0] + '=' + '"' + a[1] + '"' for a in self.html_attrs)}>'''
+            else:
+                self.opening_text = f"<{self.name}>"
+        return self.opening_text
     
     def closing(self):
-        if self.name not in SELF_CLOSING_TAGS:
-            return f"</{self.name}>"
-        return ''
+        if self.closing_text is None:
+            self.closing_text = f"</{self.name}>" if self.name not in SELF_CLOSING_TAGS else ''
+        return self.closing_text
 
     def __repr__(self) -> str:
         return self.name
@@ -86,26 +239,26 @@ class Variable:
         return self.name
     
     
-# IS_BLOCK keeps track of the current if/elif/else statement and its status
-# If a new 'if' statement is found, the variable is reset
-
-IS_BLOCK = {}   
-    
 class Expression:
     def __init__(self, expression, start, end) -> None:
         self.expression = expression
         self.start = start
         self.end = end
         
-        self.context = None
-    
-    def set_context(self, context):
-        self.context = context
+        words = expression.split()
+        self.command = words[0] if words else ''
+        self.expression_content = expression[len(self.command):].strip()
            
-    def evaluate_expression(self, context):
-        self.set_context(context)
-        expression_command = self.expression.split()[0]
-        expression_content = self.expression[len(expression_command):].strip()
+    def evaluate_expression(self, context, is_matched=False):
+        """
+        Returns the command and its evaluation against the context.
+        is_matched tells whether a previous branch of the current
+        if/elif/else chain was already rendered. Nothing is stored on
+        the expression itself, so it can be evaluated from several
+        renders at once.
+        """
+        expression_command = self.command
+        expression_content = self.expression_content
 
         if expression_command == 'for':
             loop_var, logical_operator, iterable_var = expression_content.split()
@@ -113,27 +266,67 @@ class Expression:
             if logical_operator != 'in':
                 raise SyntaxError(f"Expected 'in' keyword, got {logical_operator}")
             
-            iterable_var = RetrieveVarsFromExpression(expression_command, iterable_var, self.context).manager()
+            iterable_var = RetrieveVarsFromExpression(expression_command, iterable_var, context).manager()
             return expression_command, (loop_var, iterable_var)
         
         elif expression_command in ['if', 'elif', 'else']:   
-            if IS_BLOCK.get('if') == True:
+            if expression_command != 'if' and is_matched:
                 return expression_command, False
             
             elif expression_command == 'else':
-                if not tuple(filter(lambda x: x, IS_BLOCK.values())):
-                    return expression_command, True
-                else: 
-                    return expression_command, False
+                return expression_command, True
                 
-            expression = RetrieveVarsFromExpression(expression_command, expression_content, self.context).manager()
-            evaluation = evaluate(expression)
-            evaluation = True if evaluation else False
-            IS_BLOCK[expression_command] = evaluation
+            evaluation = evaluate_condition(expression_content, context)
             return expression_command, evaluation
+        
+        elif expression_command in ('block', 'extends'):
+            return expression_command, None
+        
+        elif expression_command == 'include':
+            # None for static names, their template is already inlined
+            if get_string_literal(expression_content) is not None:
+                return expression_command, None
+            return expression_command, compile_path(expression_content)(context)
+        
+        elif expression_command == 'cache':
+            name, variables, ttl = parse_cache_arguments(expression_content)
+            values = tuple(compile_path(variable)(context) for variable in variables)
+            return expression_command, (name, values, ttl)
           
         else:
             raise ValueError(f"Invalid expression command: {expression_command}")
 
     def __repr__(self) -> str:
         return self.expression
+
+
+class Static:
+    """
+    Markup that renders the same in every context, prerendered by the
+    optimizer (see optimizer.py). text is written as is.
+    """
+    def __init__(self, text, start, end) -> None:
+        self.text = text
+        self.start = start
+        self.end = end
+    
+    def __repr__(self) -> str:
+        return repr(self.text)
+
+
+class Output:
+    """
+    A {{ variable }} written by an optimized document, on its own
+    rather than through the inner text of a tag.
+    """
+    def __init__(self, name, start, end) -> None:
+        self.name = name
+        self.start = start
+        self.end = end
+    
+    def __repr__(self) -> str:
+        return f'{{{{{self.name}}}}}'
+
+
+NODE_KINDS = {Tag: TAG_NODE, Variable: VARIABLE_NODE, Expression: EXPRESSION_NODE, Static: STATIC_NODE,
+              Output: OUTPUT_NODE}
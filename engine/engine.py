@@ -1,21 +1,49 @@
-import codecs
-import os
+import io
 import re
-from pathlib import Path
+import time
 
-from .document import (Document, Expression, RetrieveVarsFromExpression, Tag,
+from .cache import LRUCache
+from .compiler import Compiler
+from .document import (EXPRESSION_NODE, OUTPUT_NODE, ROOT, STATIC_NODE, VARIABLE_NODE,
+                       Document, Expression, Output, RetrieveVarsFromExpression, Static, Tag,
                        Variable)
-from .utils import (BASE_DIR, add_tabulation_and_line_breaks, depth,
-                    find_deepest_value, find_specific_key,
-                    get_closing_expression_index, get_closing_tag_index,
-                    get_html_attributes, get_html_tag_name)
+from .fragments import get_fragment, make_fragment_key, set_fragment
+from .inheritance import (copy_children, get_parent_name, get_static_includes,
+                          inherit, resolving)
+from .instrumentation import new_counters
+from .loaders import FileSystemLoader
+from .optimizer import BRANCH_COMMANDS, optimize
+from .utils import (OUTPUT_MODES, PRETTY, SELF_CLOSING_TAGS, VERBATIM, get_html_attributes,
+                    get_html_tag_name, get_indentation)
 
 EXPRESSION = 'EXPRESSION'
 VARIABLE = 'VARIABLE'
 TAG = 'TAG'
+TEXT = 'TEXT'
+
+
+# Expression tokens are classified by their first word only,
+# so that a variable named 'platform' is not taken for a for loop.
+
+EXPRESSION_KEYWORDS = {
+    'for': 'FOR',
+    'endfor': 'ENDFOR',
+    'if': 'IF',
+    'elif': 'ELIF',
+    'else': 'ELSE',
+    'endif': 'ENDIF',
+    'block': 'BLOCK',
+    'endblock': 'ENDBLOCK',
+    'extends': 'EXTENDS',
+    'cache': 'CACHE',
+    'endcache': 'ENDCACHE',
+    'include': 'INCLUDE',
+}
 
 
 class Token:
+    __slots__ = ('type', 'content', 'index', 'specs')
+    
     def __init__(self, type, content, index):
         self.type = type
         self.content = content
@@ -23,308 +51,659 @@ class Token:
         self.specs = self.get_specs()
     
     def get_specs(self):
-        if 'endfor' in self.content:
-            return 'ENDFOR'
-        elif 'for' in self.content:
-            return 'FOR'
-        elif 'endif' in self.content:
-            return 'ENDIF'
-        elif 'elif' in self.content:
-            return 'ELIF'
-        elif 'if' in self.content:
-            return 'IF'
-        elif 'else' in self.content:
-            return 'ELSE'
-        elif 'endblock' in self.content:
-            return 'ENDBLOCK'
-        elif 'block' in self.content:
-            return 'BLOCK'
-        elif 'extends' in self.content:
-            return 'EXTENDS'
-        
-        if self.type == 'TAG':
-            return self.content
-        
-        if self.type == 'VARIABLE':
-            return self.content
+        if self.type == EXPRESSION:
+            words = self.content.split(None, 1)
+            command = words[0] if words else ''
+            return EXPRESSION_KEYWORDS.get(command, command.upper())
+        
+        return self.content
 
     def __repr__(self) -> str:
         return f'{self.type}:{self.specs}'
 
+
+# One alternative per token type: {% expression %}, {{ variable }}, <tag>.
+# Text in between is skipped by finditer.
+
+TOKEN_PATTERN = re.compile(r'{%(.*?)%}|{{(.*?)}}|<[^>]*>', re.DOTALL)
+
+# In verbatim mode tags are not looked for, the text in between
+# expressions and variables becomes TEXT tokens instead.
+VERBATIM_TOKEN_PATTERN = re.compile(r'{%(.*?)%}|{{(.*?)}}', re.DOTALL)
+
          
 class Lexer:    
     """
     Time complexity: O(n)
-    One iteration over the template.
+    Delimiters are found by a single precompiled regex,
+    each token's content is sliced out in one step.
     """
-    def __init__(self, template) -> None:
+    def __init__(self, template, mode=PRETTY) -> None:
         self.template = template
+        self.mode = mode
         self.tokens = []
         
-        self._index = -1
-        self.current_char = None
-        self.advance()
-    
-    def advance(self):
-        self._index += 1
-        if self._index >= len(self.template):
-            self.current_char = None
-        else:
-            self.current_char= self.template[self._index]
-    
-    def set_start_index_and_content(self, tag=False):
-        if not tag:
-            self.advance()
-            return self._index - 1, ''
-    
-    def make_expression(self):
-        self.advance()
+    def tokenize(self):
+        if self.mode == VERBATIM:
+            return self.tokenize_verbatim()
         
-        if self.current_char == '%':
-            start_index, content= self.set_start_index_and_content()
-            
-            while self.current_char + self.template[self._index + 1] != '%}':
-                content += self.current_char
-                self.advance()
-                
-            self.tokens.append(Token(EXPRESSION, content, start_index))
+        append = self.tokens.append
+        for match in TOKEN_PATTERN.finditer(self.template):
+            expression, variable = match.group(1, 2)
             
-        elif self.current_char == '{':
-            self.make_variable()
-
-    def make_variable(self):
-        start_index, content= self.set_start_index_and_content()
+            if expression is not None:
+                append(Token(EXPRESSION, expression, match.start() + 1))
+            elif variable is not None:
+                append(Token(VARIABLE, variable, match.start() + 1))
+            else:
+                append(Token(TAG, match.group(), match.start()))
         
-        while self.current_char + self.template[self._index + 1] != '}}':
-            content += self.current_char
-            self.advance()
-              
-        self.tokens.append(Token(VARIABLE, content, start_index))
+        return self.tokens
     
-    def make_tag(self):
-        start_index, content= self.set_start_index_and_content()
-        content += '<'
-
-        while self.current_char != '>':
-            content += self.current_char
-            self.advance()
+    def tokenize_verbatim(self):
+        append = self.tokens.append
+        template = self.template
+        position = 0
+        for match in VERBATIM_TOKEN_PATTERN.finditer(template):
+            if match.start() > position:
+                append(Token(TEXT, template[position:match.start()], position))
+            position = match.end()
             
-        self.tokens.append(Token(TAG, content + '>', start_index))
-        
-    def tokenize(self):   
-        while self.current_char is not None:
-            if self.current_char == '{':
-                self.make_expression()
-            elif self.current_char == '<':
-                self.make_tag()
+            expression, variable = match.group(1, 2)
+            if expression is not None:
+                append(Token(EXPRESSION, expression, match.start() + 1))
             else:
-                self.advance()
+                append(Token(VARIABLE, variable, match.start() + 1))
         
+        if position < len(template):
+            append(Token(TEXT, template[position:], position))
         return self.tokens
     
+
+# Expressions that open a block, and the ones that close it.
+# elif/else close the current branch of an if and open the next one.
+
+BLOCK_OPENERS = {'FOR': 'ENDFOR', 'IF': 'ENDIF', 'BLOCK': 'ENDBLOCK', 'CACHE': 'ENDCACHE'}
+BRANCHES = {'ELIF', 'ELSE'}
+BLOCK_CLOSERS = {
+    'ENDFOR': ('FOR',),
+    'ENDIF': ('IF', 'ELIF', 'ELSE'),
+    'ENDBLOCK': ('BLOCK',),
+    'ENDCACHE': ('CACHE',),
+}
+# A closing tag does not match a tag opened before one of these
+TAG_BOUNDARIES = BLOCK_OPENERS.keys() | BRANCHES
+
+
 class Parser:
     """
-    Time complexity: O(n²)
-    Need to optimize this.
-    Can bring down to O(nlogn) by using a while loop
-    and advancing the while loop by the length of the
-    get_index of the closing tag.
+    Time complexity: O(n)
+    One iteration over the tokens. Open tags and expressions are kept
+    on a stack and closed when their closing tag or end expression
+    arrives, so every node is appended to the document's node table
+    under its parent directly.
     """
-    def __init__(self, tokens, template) -> None:
+    def __init__(self, tokens, template, mode=PRETTY, name=None, loader=None) -> None:
         self.tokens = tokens
-        self.tag_list = []
-        
-        self.current_sibling = []
-        self.document = Document(template)
-        self.limit = 0
-        
-    def set_limit(self, tag):
-        self.limit = tag.end
-    
-    def add_new_child(self, parent, child):
-        parent[child] = {} 
-        
-    def add_tag_to_document(self, tag):
-        if not self.current_sibling:
-            # Add first tag to document
-            self.add_new_child(self.document.tree, tag)
-                
-        elif tag.start > self.current_sibling[-1].end:    
-            # Tag is not a child of the current index                                    
-            count = len([i for i in self.current_sibling if tag.start > i.end])
-            self.current_sibling = self.current_sibling[:-count]
-           
-            if not self.current_sibling:
-                self.document.tree.update({tag: {}})
-                
-            else:
-                parent = find_specific_key(self.current_sibling[-1], self.document.tree)
-                self.add_new_child(parent, tag)                  
-            
-        elif tag.start > self.current_sibling[-1].start: 
-            # Tag is a child of the current index                        
-            parents = find_specific_key(self.current_sibling[-1], self.document.tree)
-            
-            if len(parents) >= 1:
-                if list(parents.keys())[-1].end < tag.start:
-                    self.add_new_child(parents, tag) 
-                else:
-                    parent = find_deepest_value(parents)
-                    parent.update({tag: {}})
-            else:
-                self.add_new_child(parents, tag)
-                
-            self.set_limit(tag)
-            
-        self.current_sibling.append(tag)
+        self.document = Document(template, mode, name, loader)
+        self.table = self.document.table
+        
+        # Each entry is (node, specs, index of the node in the table)
+        self.stack = [(None, None, ROOT)]
+    
+    def add_node(self, node, specs=None, is_open=False):
+        index = self.table.add(node, self.stack[-1][2])
+        if is_open:
+            self.stack.append((node, specs, index))
+    
+    def find_open(self, match, stop=()):
+        """
+        Index of the closest open entry for which match is true,
+        without going past an entry whose specs are in stop.
+        """
+        for index in range(len(self.stack) - 1, 0, -1):
+            node, specs, _ = self.stack[index]
+            if match(node, specs):
+                return index
+            if specs in stop:
+                return None
+        return None
+    
+    def close(self, index, end):
+        """
+        Closes the open entry at index and everything opened after it.
+        Tags that were never closed keep the end of their opening tag.
+        """
+        node, _, node_index = self.stack[index]
+        node.end = self.table.end[node_index] = end
+        del self.stack[index:]
+    
+    def open_tag(self, token):
+        tag_name = get_html_tag_name(token)
+        html_attrs = get_html_attributes(token)
+        is_open = tag_name not in SELF_CLOSING_TAGS and not token.content.endswith('/>')
+        
+        start, end = token.index, token.index + len(token.content)
+        tag = Tag(tag_name, start, end, html_attrs=html_attrs, source=self.document.template)
+        self.add_node(tag, 'TAG', is_open)
+    
+    def close_tag(self, token):
+        tag_name = get_html_tag_name(token)
+        index = self.find_open(
+            lambda node, specs: specs == 'TAG' and node.name == tag_name,
+            stop=TAG_BOUNDARIES,
+        )
+        if index is None:
+            return
+        
+        tag, _, node_index = self.stack[index]
+        if not self.has_markup(node_index):
+            # tag.end is still the end of the opening tag
+            tag.set_text_span(tag.end, token.index)
+        self.close(index, token.index)
+    
+    def has_markup(self, index):
+        """
+        Whether the node has tags or expressions among its children,
+        only its variables being part of its inner text.
+        """
+        kinds = self.table.kinds
+        return any(kinds[child] != VARIABLE_NODE for child in self.table.children(index))
+    
+    def close_expression(self, token):
+        openers = BLOCK_CLOSERS.get(token.specs, ())
+        index = self.find_open(lambda node, specs: specs in openers)
+        if index is not None:
+            self.close(index, token.index + len(token.content))
+    
+    def add_expression(self, token):
+        if token.specs in BRANCHES:
+            index = self.find_open(lambda node, specs: specs in ('IF', 'ELIF'))
+            if index is not None:
+                self.close(index, token.index)
+        
+        start, end = token.index, token.index + len(token.content)
+        expression = Expression(token.content.strip(), start, end)
+        is_open = token.specs in BLOCK_OPENERS or token.specs in BRANCHES
+        self.add_node(expression, token.specs, is_open)
 
     def parse(self, tokens):      
-        for index, token in enumerate(tokens):
+        for token in tokens:
             if token.type == TAG and '</' not in token.content:   
-                tag_name = get_html_tag_name(token)                                   
-                tag_index = get_closing_tag_index(index, tag_name, tokens) 
-                inner_text = str()
-                
-                if tag_index:
-                    closing_tag = self.tokens[tag_index]
-                    start, end = token.index, closing_tag.index  
-                    inner_text = self.document.template[start:end + len(closing_tag.content)]
-                    
-                else:
-                    start, end = token.index, token.index + len(token.content)
-                
-                html_attrs = get_html_attributes(token)
-                tag = Tag(tag_name, start, end, inner_text, html_attrs=html_attrs)
-                self.add_tag_to_document(tag)
+                self.open_tag(token)
+            
+            elif token.type == TAG:
+                self.close_tag(token)
                     
             elif token.type == VARIABLE:
-                name = token.content
+                if not token.content.strip():
+                    raise SyntaxError(f'Empty variable at offset {token.index - 1}')
                 start, end = token.index, token.index + len(token.content)
-                self.add_tag_to_document(Variable(name, start, end))
+                # Without tags, variables are written on their own
+                node_class = Output if self.document.mode == VERBATIM else Variable
+                self.add_node(node_class(token.content, start, end))
+            
+            elif token.type == TEXT:
+                self.add_node(Static(token.content, token.index, token.index + len(token.content)))
 
-            elif token.type == EXPRESSION and 'END' not in token.specs:
-                tag_index = get_closing_expression_index(index, token, tokens)
-                name = token.content.strip()
-                start, end = token.index, tokens[tag_index].index + len(tokens[tag_index].content)
-                self.add_tag_to_document(Expression(name, start, end))
+            elif token.type == EXPRESSION and token.specs in BLOCK_CLOSERS:
+                self.close_expression(token)
             
-            else:
-                continue
+            elif token.type == EXPRESSION and not token.specs.startswith('END'):
+                self.add_expression(token)
         
+        self.table.freeze()
         return self.document
 
 
+class RenderFrame:
+    """
+    State of one render: the context variables are read from and the
+    buffer the output is written to. Loops render their body in a
+    child frame, so nothing is shared between two renders.
+    """
+    def __init__(self, context, buffer) -> None:
+        self.context = context
+        self.buffer = buffer
+        self.write = buffer.write
+    
+    def child(self, context):
+        return RenderFrame(context, self.buffer)
+
+
+# What is left to render of an expression, see Interpreter.dispatch_expression
+RENDER_CHILDREN, RENDER_LOOP, RENDER_FRAGMENT = RENDER_ACTIONS = range(3)
+
+
 class Interpreter:
     """
-    Time complexity O(nlogn)
+    Time complexity O(n)
+    Every visit method writes to the output buffer of the current
+    render frame, which is joined once at the end. The interpreter
+    only reads the document, so a single parsed template can be
+    rendered from many threads at once.
+    
+    Nodes are visited by their index in the document's node table,
+    which also gives their depth and children. Documents are rendered
+    once optimized (see optimizer.py), tags and their variables are
+    Static and Output nodes by then.
     """
     def __init__(self, document, context) -> None:
         self.document = document
-        self.context = context
-        self.document.build_document()
-        self.depth = depth(self.document.tree)
+        self.table = document.table
+        self.nodes = self.table.nodes
+        
+        frame = RenderFrame(context, io.StringIO())
+        self.render(ROOT, frame)
+        output = frame.buffer.getvalue()
+        # Verbatim output is the template's own text, it is not stripped
+        self.document_string = output if document.mode == VERBATIM else output.strip()
+    
+    def visit_variable(self, name, frame):
+        return str(RetrieveVarsFromExpression('Variable', name, frame.context).manager())
+
+    def dispatch_expression(self, index, frame, is_matched):
+        """
+        Evaluates the expression at index and writes what it outputs
+        without rendering its children: a dynamic include, a cached
+        fragment. Returns (action, argument, is_matched), action being
+        what is left to render (see RENDER_ACTIONS), None if nothing,
+        and is_matched whether the current if/elif/else chain has
+        rendered one of its branches.
+        
+        Shared by the Interpreter and the AsyncInterpreter, which only
+        differ in how they render children.
+        """
+        expression = self.nodes[index]
+        expression_command, expression_condition = expression.evaluate_expression(frame.context, is_matched)
+
+        if expression_command in BRANCH_COMMANDS:
+            # An if starts a new chain, whatever the previous one rendered
+            is_matched = (is_matched and expression_command != 'if') or expression_condition
+            return (RENDER_CHILDREN if expression_condition else None), None, is_matched
+        
+        elif expression_command == 'for':
+            return RENDER_LOOP, expression_condition, False
         
-        self.variables = list()
-        self.current_tag = str()
-        self.document_string = str()
+        elif expression_command == 'cache':
+            name, values, ttl = expression_condition
+            key = make_fragment_key(self.document.fragment_scope, name, values)
+            fragment = get_fragment(key)
+            if fragment is None:
+                return RENDER_FRAGMENT, (key, ttl), False
+            frame.write(fragment)
         
-        self.render(self.document.tree)
+        elif expression_command == 'block' or (expression_command == 'include' and expression_condition is None):
+            return RENDER_CHILDREN, None, False
+        
+        elif expression_command == 'include':
+            indentation = get_indentation(self.table.depth[index], self.document.mode)
+            frame.write(render_include(expression_condition, frame.context, indentation,
+                                       mode=self.document.mode, loader=self.document.loader))
+        
+        return None, None, False
     
-    def reset_current_string(self):
-        self.current_tag = str()
+    def store_fragment(self, frame, fragment_frame, key, ttl):
+        fragment = fragment_frame.buffer.getvalue()
+        set_fragment(key, fragment, ttl)
+        frame.write(fragment)
     
-    def set_context(self, context):
-        self.context = context
+    def visit_expression(self, index, frame, is_matched=False):
+        """
+        Renders the expression and returns whether the current
+        if/elif/else chain has rendered one of its branches.
+        """
+        action, argument, is_matched = self.dispatch_expression(index, frame, is_matched)
+        if action == RENDER_CHILDREN:
+            self.render(index, frame)
+        elif action == RENDER_LOOP:
+            self.visit_loop(index, frame, *argument)
+        elif action == RENDER_FRAGMENT:
+            self.visit_fragment(index, frame, *argument)
+        return is_matched
     
-    def visit_tag(self, tag):
-        current_string = tag.opening()
-        if tag.content:
-            self.reset_current_string()
-            current_string += tag.inner_text + self.render(tag.content)
+    def visit_loop(self, index, frame, looped_var, iterable_var):
+        loop_frame = frame.child(None)
         
-        else:
-            current_string += tag.inner_text
+        for iterable in iterable_var:
+            loop_frame.context = {looped_var: iterable}
+            self.render(index, loop_frame)
+    
+    def visit_fragment(self, index, frame, key, ttl):
+        """
+        Renders a {% cache %} block missing from the cache into its own
+        buffer, then stores it.
+        """
+        fragment_frame = RenderFrame(frame.context, io.StringIO())
+        self.render(index, fragment_frame)
+        self.store_fragment(frame, fragment_frame, key, ttl)
 
-        current_depth = self.depth.get(tag)
-        return current_string + add_tabulation_and_line_breaks(
-            tag.closing(), 
-            tabulation=current_depth - 1
-        )
+    def render(self, index, frame):
+        """
+        Renders the children of the node at index.
+        """
+        # Whether a branch of the current if/elif/else chain was rendered.
+        # Local to this call, so nested chains don't see each other.
+        is_matched = False
+        kinds = self.table.kinds
+        
+        for child in self.table.children(index):
+            kind = kinds[child]
+            if kind == EXPRESSION_NODE:
+                is_matched = self.visit_expression(child, frame, is_matched)
+            elif kind == STATIC_NODE:
+                frame.write(self.nodes[child].text)
+                is_matched = False
+            elif kind == OUTPUT_NODE:
+                frame.write(self.visit_variable(self.nodes[child].name, frame))
+                is_matched = False
+
+
+class CountingInterpreter(Interpreter):
+    """
+    Interpreter that also fills the counters of instrumentation.COUNTERS.
+    Only used when hooks are installed, so plain renders pay nothing.
+    """
+    def __init__(self, document, context, counters) -> None:
+        self.counters = counters
+        super().__init__(document, context)
+    
+    def visit_variable(self, name, frame):
+        self.counters['variable_lookups'] += 1
+        return super().visit_variable(name, frame)
+    
+    def visit_expression(self, index, frame, is_matched=False):
+        command = self.nodes[index].command
+        if command == 'if' or (command == 'elif' and not is_matched):
+            self.counters['expression_evaluations'] += 1
+        elif command == 'for':
+            self.counters['variable_lookups'] += 1
+        return super().visit_expression(index, frame, is_matched)
     
-    def visit_variable(self, variable):
-        var_type = variable.__class__.__name__
-        replacement = RetrieveVarsFromExpression(var_type, variable.name, self.context).manager()
-        self.variables.append((variable.name, replacement))
-        return ''
+    def visit_loop(self, index, frame, looped_var, iterable_var):
+        super().visit_loop(index, frame, looped_var, self.count_iterations(iterable_var))
+    
+    def count_iterations(self, iterable_var):
+        for iterable in iterable_var:
+            self.counters['loop_iterations'] += 1
+            yield iterable
+
 
-    def visit_expression(self, expression):
-        expression_command, expression_condition = expression.evaluate_expression(self.context)
+DEFAULT_FLUSH_SIZE = 8192
 
-        if expression_command in ['if', 'elif', 'else'] and expression_condition:
-            children = find_specific_key(expression, self.document.tree)
-            self.reset_current_string()
-            return self.render(children)
+
+class Template:
+    """
+    A parsed template that can be rendered against many contexts.
+    Lexing and parsing happen once, in the constructor.
+    
+    Calling compile() generates a Python render function for the
+    template (see compiler.py), which is then used instead of the
+    Interpreter. Streaming always goes through the compiled function.
+    
+    Given instrumentation.Hooks, the constructor, compile() and render()
+    report their phases, and render() its counters.
+    
+    A template that extends another one is flattened in the constructor:
+    its document becomes the parent's tree with the template's blocks.
+    Templates included with a static name are inlined the same way.
+    dependencies holds the loader signature of every template extended or
+    included, so the cache can tell when the flattened tree is outdated.
+    
+    The flattened document is then optimized (see optimizer.py) into the
+    one that is rendered: constant conditions folded and static markup
+    prerendered in the output mode, OUTPUT_MODE unless mode is given.
+    """
+    def __init__(self, source, name=None, compiled=False, hooks=None, loader=None, mode=None) -> None:
+        self.name = name
+        self.source = source
+        self.mode = mode or OUTPUT_MODE
+        # None for the global LOADER, looked up when it is needed
+        self.loader = loader
+        self.render_function = None
+        self.stream_function = None
+        self.counting_function = None
+        self.dependencies = {}
         
-        elif expression_command == 'for' and expression_condition:
-            children = find_specific_key(expression, self.document.tree)
-            looped_var, iterable_var = expression_condition
-            original_context = self.context
-            
-            forloop_content = ''
-            
-            for iterable in iterable_var:
-                self.set_context({looped_var: iterable})
-                self.reset_current_string()
-                forloop_content += self.render(children) 
-                
-            self.set_context(original_context)
+        start = time.perf_counter()
+        tokens = Lexer(source, self.mode).tokenize()
+        tokenized = time.perf_counter()
+        self.document = Parser(tokens, source, self.mode, name, loader).parse(tokens)
+        parsed = time.perf_counter()
+        self.token_count = len(tokens)
+        
+        parent_name = get_parent_name(self.document.table)
+        if parent_name is not None:
+            self.inherit(parent_name, loader or LOADER, hooks)
+        self.include(loader or LOADER, hooks)
+        self.optimized = optimize(self.document, self.mode)
+        
+        if hooks is not None:
+            hooks.phase(name, 'tokenize', start, tokenized)
+            hooks.phase(name, 'parse', tokenized, parsed)
+            hooks.phase(name, 'build', parsed, time.perf_counter())
+        
+        if compiled:
+            self.compile(hooks)
+    
+    def inherit(self, parent_name, loader, hooks=None):
+        with resolving(self.name):
+            parent = get_compiled_template(parent_name, hooks, self.loader, self.mode)
+        
+        self.dependencies = {parent_name: loader.get_signature(parent_name)}
+        self.dependencies.update(parent.dependencies)
+        self.document = inherit(self.document, parent.document)
+    
+    def include(self, loader, hooks=None):
+        """
+        Inlines the templates included with a static name: their nodes
+        are copied under the include node.
+        """
+        table = self.document.table
+        for index, name in list(get_static_includes(table)):
+            with resolving(self.name):
+                partial = get_compiled_template(name, hooks, self.loader, self.mode)
             
-            return forloop_content
-        
-        return ''
-
-    def render(self, tag):
-        for parent in tag.keys():
-            if isinstance(parent, Tag):
-                self.current_tag += add_tabulation_and_line_breaks(
-                    self.visit_tag(parent), 
-                    tabulation=self.depth.get(parent) - 1
-                )
-                
-            elif isinstance(parent, Variable):
-                self.current_tag += self.visit_variable(parent)
-            elif isinstance(parent, Expression):
-                self.current_tag += self.visit_expression(parent)
+            copy_children(table, partial.document.table, ROOT, index)
+            self.dependencies[name] = loader.get_signature(name)
+            self.dependencies.update(partial.dependencies)
+    
+    def is_uptodate(self, loader):
+        return all(loader.get_signature(name) == signature for name, signature in self.dependencies.items())
+    
+    def compile(self, hooks=None):
+        if self.render_function is None:
+            start = time.perf_counter()
+            render_function, self.stream_function = Compiler(self.optimized, self.name).compile()
+            # Set last: render_function tells other threads that compiling is done
+            self.render_function = render_function
+            if hooks is not None:
+                hooks.phase(self.name, 'compile', start, time.perf_counter())
+        return self
+    
+    def __getstate__(self):
+        # Generated functions can't be pickled, they are rebuilt on load
+        state = self.__dict__.copy()
+        state['render_function'] = state['stream_function'] = state['counting_function'] = None
+        state['compiled'] = self.render_function is not None
+        return state
+    
+    def __setstate__(self, state):
+        compiled = state.pop('compiled')
+        self.__dict__.update(state)
+        if compiled:
+            self.compile()
+    
+    def render(self, context, hooks=None):
+        if hooks is not None:
+            return self.render_counted(context, hooks)
+        if self.render_function is not None:
+            return self.render_function(context)
+        return Interpreter(self.optimized, context).document_string
+    
+    def render_counted(self, context, hooks):
+        counters = new_counters(self.token_count, len(self.document.table))
+        start = time.perf_counter()
+        
+        if self.render_function is not None:
+            if self.counting_function is None:
+                self.counting_function = Compiler(self.optimized, self.name).compile_counting()
+            result = self.counting_function(context, counters)
+        else:
+            result = CountingInterpreter(self.optimized, context, counters).document_string
+        
+        hooks.phase(self.name, 'render', start, time.perf_counter())
+        hooks.counters(self.name, counters)
+        return result
+    
+    def stream(self, context, flush_size=DEFAULT_FLUSH_SIZE):
+        """
+        Yields the rendered document in chunks of roughly flush_size
+        characters. Chunks are cut after a top-level node or a for
+        iteration, so memory stays bounded by flush_size plus one node.
+        """
+        self.compile()
+        buffer = []
+        size, counted = 0, 0
+        
+        for _ in self.stream_function(context, buffer):
+            size += sum(map(len, buffer[counted:]))
+            counted = len(buffer)
+            if size >= flush_size:
+                yield ''.join(buffer)
+                buffer.clear()
+                size, counted = 0, 0
+        
+        if buffer:
+            yield ''.join(buffer)
+    
+    def __repr__(self) -> str:
+        return f'<Template {self.name}>'
+
+
+class ChunkStripper:
+    """
+    Same as str.strip() on a document fed in chunks,
+    without ever holding more than one chunk.
+    """
+    def __init__(self) -> None:
+        self.started = False
+        self.tail = ''
+    
+    def feed(self, chunk):
+        """
+        Returns the text that can be sent for this chunk, maybe empty.
+        """
+        if not self.started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                return ''
+            self.started = True
             
-            if parent == list(self.document.tree.keys())[-1]:
-                self.document_string += self.current_tag.strip()
-                for var_name, replacement in self.variables:
-                    vars = re.findall(r'{{\s*{0}+\s*}}'.format(var_name), self.document_string)
-                    vars = '{' + vars[0] + '}' 
-                    self.document_string = self.document_string.replace(vars, replacement, 1)
-                     
-        return self.current_tag
+        body = chunk.rstrip()
+        if not body:
+            self.tail += chunk
+            return ''
+        
+        text = self.tail + body
+        self.tail = chunk[len(body):]
+        return text
+
+
+def strip_chunks(chunks):
+    stripper = ChunkStripper()
+    for chunk in chunks:
+        text = stripper.feed(chunk)
+        if text:
+            yield text
+
+
+# Compiled templates, keyed by name and the loader's signature of the
+# template (mtime and size for files). An edited template gets a new key
+# and is rebuilt on its next lookup, the stale entry simply ages out.
+
+TEMPLATE_CACHE = LRUCache(maxsize=128)
+
+LOADER = FileSystemLoader()
+
+OUTPUT_MODE = PRETTY
+
+
+def set_loader(loader):
+    """
+    Replaces the loader templates are looked up with.
+    """
+    global LOADER
+    LOADER = loader
+    TEMPLATE_CACHE.clear()
+
+
+def set_output_mode(mode):
+    """
+    Sets the output mode templates are built in: pretty, preserve,
+    compact or verbatim (see utils.OUTPUT_MODES).
+    """
+    global OUTPUT_MODE
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode {mode}, expected one of {', '.join(OUTPUT_MODES)}")
+    OUTPUT_MODE = mode
+    TEMPLATE_CACHE.clear()
 
 
 def get_template(template):
-    base = Path(BASE_DIR).parent
-    templates = os.path.join(base, 'templates')
-    templates = os.listdir(templates)
-    if template in templates:
-        template_path = os.path.join(base, 'templates', template)
-        return codecs.open(template_path, 'r', 'utf-8').read()
+    return LOADER.get_source(template)
+
+
+def get_compiled_template(template, hooks=None, loader=None, mode=None):
+    """
+    The template found by loader, LOADER by default, built in mode,
+    OUTPUT_MODE by default. Each loader and mode has its own cache
+    entry, a template extending or including another one gets it from
+    its own loader and in its own mode.
+    """
+    mode = mode or OUTPUT_MODE
+    source_loader = loader or LOADER
+    key = (template, mode, loader, source_loader.get_signature(template))
     
-    raise Exception(f'Template {template} does not exist...')
+    compiled = TEMPLATE_CACHE.get(key)
+    if compiled is None or not compiled.is_uptodate(source_loader):
+        compiled = Template(source_loader.get_source(template), name=template, hooks=hooks, loader=loader, mode=mode)
+        TEMPLATE_CACHE.set(key, compiled)
         
+    return compiled
         
-def render_to_string(template, context):
-    template = get_template(template)
-    if not template:
-        raise Exception('Template does not exist')
+        
+def render_include(name, context, indentation, compiled=False, mode=None, loader=None):
+    """
+    Output of a template included with a dynamic name, indented to the
+    position of the include, found by the includer's loader and built in
+    its mode. The template comes from the cache, so including it from a
+    loop does not read nor parse it again.
+    """
+    partial = get_compiled_template(name, loader=loader, mode=mode)
+    if compiled:
+        partial.compile()
     
-    result = Lexer(template).tokenize()
-    result = Parser(result, template).parse(result)
-    result = Interpreter(result, context)
-    print(result.document_string)
+    text = partial.render(context)
+    if not text or not indentation:
+        return text
+    return indentation + text.replace('\n', indentation)
+
+
+def render_to_string(template, context, compiled=False, hooks=None):
+    template = get_compiled_template(template, hooks)
+    if compiled:
+        template.compile(hooks)
+    return template.render(context, hooks)
+
+
+def render_to_stream(template, context, flush_size=DEFAULT_FLUSH_SIZE):
+    if not isinstance(template, Template):
+        template = get_compiled_template(template)
+    chunks = template.stream(context, flush_size)
+    return chunks if template.mode == VERBATIM else strip_chunks(chunks)
+
 
-    return result
+def render_to_file(template, context, fp, flush_size=DEFAULT_FLUSH_SIZE):
+    for chunk in render_to_stream(template, context, flush_size):
+        fp.write(chunk)
@@ -1,9 +1,11 @@
 from glob import escape
 import logging
+import operator
 import string
 from logging.config import IDENTIFIER
 
-logging.basicConfig(level=logging.DEBUG)
+from .cache import LRUCache
+
 logger = logging.getLogger('LANGUAGE')
 
 ### GRAMMAR ###
@@ -73,11 +75,14 @@ KEYWORDS = [
 
 LETTERS = string.ascii_letters
 LETTERS_DIGITS = LETTERS + DIGITS
+WHITESPACE = ' \t\r\n'
 
 
 ### NODES ###
 
 class StringNode:
+    __slots__ = ('token',)
+
     def __init__(self, token):
         self.token = token
 
@@ -85,6 +90,8 @@ class StringNode:
         return str(self.token.value)
 
 class NumberNode:
+    __slots__ = ('token',)
+
     def __init__(self, token):
         self.token = token
 
@@ -92,6 +99,8 @@ class NumberNode:
         return str(self.token.value)
 
 class VarAccessNode:
+    __slots__ = ('var_name_token',)
+
     def __init__(self, var_name_token) -> None:
         self.var_name_token = var_name_token
     
@@ -99,6 +108,8 @@ class VarAccessNode:
         return f'{self.var_name_token}'
 
 class VarAssignNode:
+    __slots__ = ('var_name_token', 'value_node')
+
     def __init__(self, var_name_token, value_node) -> None:
         self.var_name_token = var_name_token
         self.value_node = value_node
@@ -107,6 +118,8 @@ class VarAssignNode:
         return f'{self.var_name_token} = {self.value_node}'
 
 class BinaryOperation:
+    __slots__ = ('left', 'operator', 'right')
+
     def __init__(self, left, operator, right):
         self.left = left
         self.operator = operator
@@ -117,6 +130,8 @@ class BinaryOperation:
 
 
 class UnaryOperation:
+    __slots__ = ('operator', 'right')
+
     def __init__(self, operator, right):
         self.operator = operator
         self.right = right
@@ -128,6 +143,8 @@ class UnaryOperation:
 ### LEXER ###
 
 class Token:
+    __slots__ = ('value', 'type')
+
     def __init__(self, value, type) -> None:
         self.value = value
         self.type = type
@@ -163,10 +180,8 @@ class Lexer:
                 self.tokens.append(self.make_string())
             elif self.current_char in LETTERS:
                 self.tokens.append(self.make_identifier())
-            elif self.current_char == ' ':
+            elif self.current_char in WHITESPACE:
                 self.advance()
-            elif self.current_char == '"':
-                self.tokens.append(self.make_string())
             elif self.current_char == '+':
                 self.tokens.append(Token(self.current_char, PLUS))
                 self.advance()
@@ -194,10 +209,10 @@ class Lexer:
                 self.tokens.append(self.make_equals())
             elif self.current_char == '<':
                 self.tokens.append(self.make_less_than())
-                self.advance()
             elif self.current_char == '>':
                 self.tokens.append(self.make_greater_than())
-                self.advance()
+            else:
+                raise SyntaxError(f"Unexpected character {self.current_char!r} in {self.expression!r}")
 
         return self.tokens
 
@@ -214,14 +229,15 @@ class Lexer:
         while self.current_char != None and (self.current_char != '"' or escape_character):
             if escape_character:
                 string += escape_characters.get(self.current_char, self.current_char)
+                escape_character = False
+            elif self.current_char == '\\':
+                escape_character = True
             else:
-                if self.current_char == '\\':
-                    escape_character = True
-                else:
-                    string += self.current_char
+                string += self.current_char
             self.advance()
-            escape_character = False
-
+        
+        # Skips the closing quote
+        self.advance()
         return Token(string, STRING)
     
     def make_less_than(self):
@@ -273,7 +289,7 @@ class Lexer:
     
     def make_identifier(self):
         identifier_str = ''
-        while self.current_char != None and self.current_char in LETTERS_DIGITS + '_':
+        while self.current_char != None and self.current_char in LETTERS_DIGITS + '_.':
             identifier_str += self.current_char
             self.advance()
         
@@ -390,99 +406,55 @@ class Parser:
 ### INTERPRETER ### 
 
 
-class Number:
-    def __init__(self, value):
-        self.value = value
-        self.set_context()
-    
-    def set_context(self, context=None):
-        self.context = context
-        return self
-    
-    def added_to(self, other):
-        if isinstance(other, Number):
-            return Number(self.value + other.value).set_context(self.context)
-    
-    def subtracted_by(self, other):
-        if isinstance(other, Number):
-            return Number(self.value - other.value).set_context(self.context)
-    
-    def multiplied_by(self, other):
-        if isinstance(other, Number):
-            return Number(self.value * other.value).set_context(self.context)
-    
-    def divided_by(self, other):
-        if isinstance(other, Number):
-            return Number(self.value / other.value).set_context(self.context)
-    
-    def powered_by(self, other):
-        if isinstance(other, Number):
-            return Number(self.value ** other.value).set_context(self.context)
-        
-    def get_comparison_eq(self, other):
-        if isinstance(other, Number):
-            return Number(int(self.value == other.value)).set_context(self.context)
-    
-    def get_comparison_ne(self, other):
-        if isinstance(other, Number):
-            return Number(int(self.value != other.value)).set_context(self.context)
-    
-    def get_comparison_lt(self, other):
-        if isinstance(other, Number):
-            return Number(int(self.value < other.value)).set_context(self.context)
-    
-    def get_comparison_gt(self, other):
-        if isinstance(other, Number):
-            return Number(int(self.value > other.value)).set_context(self.context)
-    
-    def get_comparison_lte(self, other):
-        if isinstance(other, Number):
-            return Number(int(self.value <= other.value)).set_context(self.context)
-    
-    def get_comparison_gte(self, other):
-        if isinstance(other, Number):
-            return Number(int(self.value >= other.value)).set_context(self.context)
-    
-    def anded_by(self, other):
-        if isinstance(other, Number):
-            return Number(int(self.value and other.value)).set_context(self.context)
-    
-    def ored_by(self, other):
-        if isinstance(other, Number):
-            return Number(int(self.value or other.value)).set_context(self.context)
-    
-    def notted(self):
-        return Number(1 if self.value == 0 else 0).set_context(self.context)
-    
-    def __repr__(self) -> str:
-        return str(self.value)
-    
-    
-class String:
-    def __init__(self, value):
-        self.value = value
-        
-    def set_context(self, context=None):
-        self.context = context
-        return self
-        
-    def added_to(self, other):
-        if isinstance(other, String):
-            return String(self.value + other.value).set_context(self.context)
-
-    def multed_by(self, other):
-        if isinstance(other, Number):
-            return String(self.value * other.value).set_context(self.context)
-    
-    def get_comparison_eq(self, other):
-        return Number(self.value == other.value).set_context(self.context)
-
-    def get_comparison_ne(self, other):
-        return Number(self.value != other.value).set_context(self.context)
-
-
-    def __repr__(self):
-        return f'"{self.value}"'
+# Values are native Python ints, floats, strs and bools. The operand
+# types each operator accepts are listed here, so that both evaluators
+# report a mistyped expression the same way, as a TypeError. Values of
+# other types (lists, dicts... from the bindings) follow Python's rules.
+
+BINARY_OPERATORS = {
+    PLUS: operator.add,
+    MINUS: operator.sub,
+    MULTIPLY: operator.mul,
+    DIVIDE: operator.truediv,
+    POWER: operator.pow,
+    DOUBLE_EQUALS: operator.eq,
+    NOT_EQUALS: operator.ne,
+    LESS_THAN: operator.lt,
+    LESS_THAN_OR_EQUAL: operator.le,
+    GREATER_THAN: operator.gt,
+    GREATER_THAN_OR_EQUAL: operator.ge,
+}
+
+VALUE_TYPES = {int: 'int', bool: 'int', float: 'float', str: 'str'}
+
+NUMBER_OPERANDS = {('int', 'int'), ('int', 'float'), ('float', 'int'), ('float', 'float')}
+ORDERED_OPERANDS = NUMBER_OPERANDS | {('str', 'str')}
+
+TYPE_RULES = {
+    PLUS: ORDERED_OPERANDS,
+    MINUS: NUMBER_OPERANDS,
+    MULTIPLY: NUMBER_OPERANDS | {('str', 'int'), ('int', 'str')},
+    DIVIDE: NUMBER_OPERANDS,
+    POWER: NUMBER_OPERANDS,
+    LESS_THAN: ORDERED_OPERANDS,
+    LESS_THAN_OR_EQUAL: ORDERED_OPERANDS,
+    GREATER_THAN: ORDERED_OPERANDS,
+    GREATER_THAN_OR_EQUAL: ORDERED_OPERANDS,
+}
+
+
+def check_operands(operator_type, left, right):
+    """
+    Raises a TypeError if the operator does not apply to the operands.
+    == and != apply to anything.
+    """
+    allowed = TYPE_RULES.get(operator_type)
+    types = (VALUE_TYPES.get(type(left)), VALUE_TYPES.get(type(right)))
+    if allowed is None or None in types:
+        return
+    
+    if types not in allowed:
+        raise TypeError(f'Unsupported operands for {operator_type}: {types[0]} and {types[1]}')
 
 
 class Context:
@@ -496,11 +468,12 @@ class SymbolTable:
         self.symbols = {}
         self.parent = None
     
-    def get(self, name):
-        value = self.symbols.get(name, None)
-        if value is None and self.parent:
-            return self.parent.get(name)
-        return value
+    def get(self, name, default=None):
+        if name in self.symbols:
+            return self.symbols[name]
+        if self.parent:
+            return self.parent.get(name, default)
+        return default
     
     def set(self, name, value):
         self.symbols[name] = value    
@@ -509,36 +482,27 @@ class SymbolTable:
         del self.symbols[name]
 
 
+UNDEFINED = object()
+
+
 class Interpreter:
-    
+    """
+    Walks the AST and returns the native value of the expression.
+    """
     def visit(self, node, context):
-        name = node.__class__.__name__
-
-        if name == 'NumberNode':
-            return self.visit_NumberNode(node, context)
-        elif name == 'BinaryOperation':
-            return self.visit_BinaryOperation(node, context)
-        elif name == 'UnaryOperation':
-            return self.visit_UnaryOperation(node, context)
-        elif name == 'VarAssignNode':
-            return self.visit_VarAssignNode(node, context)
-        elif name == 'VarAccessNode':
-            return self.visit_VarAccessNode(node, context)
-        elif name == 'StringNode':
-            return self.visit_StringNode(node, context)
-        else:
-            raise Exception(f'Unknown node: {name}')
+        visitor = INTERPRETER_VISITORS.get(type(node))
+        if visitor is None:
+            raise Exception(f'Unknown node: {node.__class__.__name__}')
+        return visitor(self, node, context)
     
     def visit_StringNode(self, node, context):
-        return String(node.token.value).set_context(context)
+        return node.token.value
     
     def visit_VarAccessNode(self, node, context):
         var_name = node.var_name_token.value
-        value = context.symbol_table.get(var_name)
-        
-        if not value:
-            return None
-        
+        value = context.symbol_table.get(var_name, UNDEFINED)
+        if value is UNDEFINED:
+            raise NameError(f'Unknown variable: {var_name}')
         return value
     
     def visit_VarAssignNode(self, node, context):
@@ -548,73 +512,240 @@ class Interpreter:
         return value
         
     def visit_NumberNode(self, node, context):
-        return Number(node.token.value).set_context(context)
+        return node.token.value
     
     def visit_UnaryOperation(self, node, context):
+        value = self.visit(node.right, context)
         if node.operator.type == PLUS:
-            return self.visit(node.right, context)
+            return value
         elif node.operator.type == MINUS:
-            return self.visit(node.right, context).multiplied_by(Number(-1))
-        elif node.operator.type.matches(KEYWORD, 'NOT'):
-            return self.visit(node.right, context).notted()
+            check_operands(MINUS, 0, value)
+            return -value
+        elif node.operator.matches(KEYWORD, 'NOT'):
+            return not value
         else:
             raise Exception(f'Unknown operator {node.operator.type}')
     
     def visit_BinaryOperation(self, node, context):
+        operator_token = node.operator
         left = self.visit(node.left, context)
+        
+        # Like Python, AND and OR return one of their operands
+        if operator_token.matches(KEYWORD, 'AND'):
+            return left and self.visit(node.right, context)
+        elif operator_token.matches(KEYWORD, 'OR'):
+            return left or self.visit(node.right, context)
+        
+        function = BINARY_OPERATORS.get(operator_token.type)
+        if function is None:
+            raise Exception(f'Unknown operator {operator_token.type}')
+        
         right = self.visit(node.right, context)
+        check_operands(operator_token.type, left, right)
+        return function(left, right)
 
-        if node.operator.type == PLUS:
-            return left.added_to(right)
-        elif node.operator.type == MINUS:
-            return left.subtracted_by(right)
-        elif node.operator.type == MULTIPLY:
-            return left.multiplied_by(right)
-        elif node.operator.type == DIVIDE:
-            return left.divided_by(right)
-        elif node.operator.type == POWER:  
-            return left.powered_by(right)
-        elif node.operator.type == DOUBLE_EQUALS:
-            return left.get_comparison_eq(right)
-        elif node.operator.type == NOT_EQUALS:
-            return left.get_comparison_ne(right)
-        elif node.operator.type == LESS_THAN:
-            return left.get_comparison_lt(right)
-        elif node.operator.type == LESS_THAN_OR_EQUAL:
-            return left.get_comparison_lte(right)
-        elif node.operator.type == GREATER_THAN:
-            return left.get_comparison_gt(right)
-        elif node.operator.type == GREATER_THAN_OR_EQUAL:
-            return left.get_comparison_gte(right)   
-        elif node.operator.matches(KEYWORD, 'AND'):
-            return left.anded_by(right)
-        elif node.operator.matches(KEYWORD, 'OR'):
-            return left.ored_by(right)
-        else:
-            raise Exception(f'Unknown operator {node.operator.type}')
+
+INTERPRETER_VISITORS = {
+    NumberNode: Interpreter.visit_NumberNode,
+    StringNode: Interpreter.visit_StringNode,
+    VarAccessNode: Interpreter.visit_VarAccessNode,
+    VarAssignNode: Interpreter.visit_VarAssignNode,
+    UnaryOperation: Interpreter.visit_UnaryOperation,
+    BinaryOperation: Interpreter.visit_BinaryOperation,
+}
+
+
+### CLOSURE COMPILER ###
+
+# Instead of walking the AST on every evaluation, each node is turned
+# once into a Python closure. Operators are resolved at compile time,
+# so evaluating only calls closures and operator functions on native
+# Python values.
+
+def compile_constant(node):
+    value = node.token.value
+    return lambda bindings: value
+
+
+def compile_var_access(node):
+    name = node.var_name_token.value
+    
+    def var_access(bindings):
+        if name in bindings:
+            return bindings[name]
+        value = global_symbol_table.get(name, UNDEFINED)
+        if value is UNDEFINED:
+            raise NameError(f'Unknown variable: {name}')
+        return value
+    
+    return var_access
+
+
+def compile_var_assign(node):
+    name = node.var_name_token.value
+    value_function = compile_node(node.value_node)
+    
+    def var_assign(bindings):
+        # Into the bindings of this evaluation, renders running at the
+        # same time don't see each other's variables
+        value = value_function(bindings)
+        bindings[name] = value
+        return value
+    
+    return var_assign
+
+
+def compile_unary_operation(node):
+    right = compile_node(node.right)
+    
+    if node.operator.type == PLUS:
+        return right
+    elif node.operator.type == MINUS:
+        def negation(bindings):
+            value = right(bindings)
+            try:
+                return -value
+            except TypeError:
+                # Same error as the Interpreter's
+                check_operands(MINUS, 0, value)
+                raise
+        return negation
+    elif node.operator.matches(KEYWORD, 'NOT'):
+        return lambda bindings: not right(bindings)
+    else:
+        raise Exception(f'Unknown operator {node.operator.type}')
+
+
+def compile_binary_operation(node):
+    left = compile_node(node.left)
+    right = compile_node(node.right)
+    
+    if node.operator.matches(KEYWORD, 'AND'):
+        return lambda bindings: left(bindings) and right(bindings)
+    elif node.operator.matches(KEYWORD, 'OR'):
+        return lambda bindings: left(bindings) or right(bindings)
+    
+    operator_type = node.operator.type
+    function = BINARY_OPERATORS.get(operator_type)
+    if function is None:
+        raise Exception(f'Unknown operator {operator_type}')
+    
+    def binary_operation(bindings):
+        left_value, right_value = left(bindings), right(bindings)
+        try:
+            return function(left_value, right_value)
+        except TypeError:
+            # Same error as the Interpreter's
+            check_operands(operator_type, left_value, right_value)
+            raise
+    
+    return binary_operation
+
+
+NODE_COMPILERS = {
+    NumberNode: compile_constant,
+    StringNode: compile_constant,
+    VarAccessNode: compile_var_access,
+    VarAssignNode: compile_var_assign,
+    UnaryOperation: compile_unary_operation,
+    BinaryOperation: compile_binary_operation,
+}
+
+
+def compile_node(node):
+    """
+    Returns a function of the bindings that computes the node's value.
+    """
+    compiler = NODE_COMPILERS.get(type(node))
+    if compiler is None:
+        raise Exception(f'Unknown node: {node.__class__.__name__}')
+    return compiler(node)
 
 
 ### MAIN ###
 
 
 global_symbol_table = SymbolTable()
-global_symbol_table.set("null", Number(0))
+global_symbol_table.set("null", 0)
+
+
+def get_variable_names(node):
+    """
+    Names read by the expression, in order of appearance.
+    """
+    if isinstance(node, VarAccessNode):
+        return [node.var_name_token.value]
+    if isinstance(node, BinaryOperation):
+        return get_variable_names(node.left) + get_variable_names(node.right)
+    if isinstance(node, UnaryOperation):
+        return get_variable_names(node.right)
+    if isinstance(node, VarAssignNode):
+        return get_variable_names(node.value_node)
+    return []
+
+
+NO_BINDINGS = {}
+
+
+class CompiledExpression:
+    """
+    A lexed, parsed and closure-compiled expression that can be
+    evaluated many times, against different variable bindings.
+    Bindings map variable names to native Python values.
+    """
+    def __init__(self, expression) -> None:
+        self.expression = expression
+        tokens = Lexer(expression).get_tokens()
+        self.ast = Parser(tokens).parse()
+        self.names = tuple(dict.fromkeys(get_variable_names(self.ast)))
+        self.function = compile_node(self.ast)
+        self.assigns = isinstance(self.ast, VarAssignNode)
+        
+    def evaluate(self, bindings=None):
+        """
+        VAR assignments are written to bindings, to a new dict when
+        none are given.
+        """
+        if bindings is None:
+            bindings = {} if self.assigns else NO_BINDINGS
+        return self.function(bindings)
+    
+    def interpret(self, bindings=None):
+        """
+        Same as evaluate, but walks the AST with the Interpreter.
+        """
+        context = Context('<program>')
+        context.symbol_table = SymbolTable()
+        context.symbol_table.parent = global_symbol_table
+        if bindings is not None:
+            context.symbol_table.symbols = bindings
+                
+        return Interpreter().visit(self.ast, context)
+    
+    def __repr__(self) -> str:
+        return f'<CompiledExpression {self.expression}>'
 
-def evaluate(expression):
-    lexer = Lexer(expression)
-    result = lexer.get_tokens()
 
-    parser = Parser(result)
-    result = parser.parse()
-    
-    interpreter = Interpreter()
-    context = Context('<program>')
-    context.symbol_table = global_symbol_table
-    result = interpreter.visit(result, context)
-    return result.value
+# Parsed expressions, keyed by expression text.
+
+EXPRESSION_CACHE = LRUCache(maxsize=512)
+
+
+def compile_expression(expression):
+    compiled = EXPRESSION_CACHE.get(expression)
+    if compiled is None:
+        compiled = CompiledExpression(expression)
+        EXPRESSION_CACHE.set(expression, compiled)
+    return compiled
+
+
+def evaluate(expression, bindings=None):
+    return compile_expression(expression).evaluate(bindings)
 
 if __name__ == '__main__':
+    # Variables assigned with VAR are kept for the whole session
+    session = {}
     while True:
         text = input('>> ')
-        result = evaluate(text)
+        result = evaluate(text, session)
         print(result)
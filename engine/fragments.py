@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+from .cache import LRUCache
+
+# {% cache "name" var1 var2 ttl %}: a quoted or bare name, the variables
+# the fragment depends on, then an optional ttl in seconds.
+CACHE_ARGUMENTS_PATTERN = re.compile(r'\s*("[^"]*"|\'[^\']*\'|\S+)\s*(.*)', re.DOTALL)
+
+
+def parse_cache_arguments(arguments):
+    """
+    Returns the (name, variables, ttl) of a cache expression's content.
+    ttl is None for fragments that never expire, a ttl of 0 is refused.
+    """
+    match = CACHE_ARGUMENTS_PATTERN.fullmatch(arguments)
+    if match is None:
+        raise SyntaxError('Expected a fragment name after cache')
+
+    name, variables = match.group(1), match.group(2).split()
+    if name[0] in '"\'':
+        name = name[1:-1]
+
+    ttl = None
+    if variables and variables[-1].isdigit():
+        ttl = int(variables.pop())
+        if not ttl:
+            raise SyntaxError(f'Expected a ttl of at least one second for fragment {name}, got 0')
+    return name, tuple(variables), ttl
+
+
+def make_fragment_scope(template_name, source, mode):
+    """
+    Prefix of the keys of a template's fragments. Templates, versions
+    of a template and output modes each get their own fragments.
+    """
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+    return f'{template_name}:{digest}:{mode}'
+
+
+def encode_value(value):
+    raise TypeError(f'Cannot key a fragment on a {type(value).__name__} value, '
+                    'expected strings, numbers, booleans, None, lists or dicts')
+
+
+def make_fragment_key(scope, name, values):
+    """
+    Fragments are keyed on their template's scope, their name and the
+    values of the variables they depend on, so a change in one of them
+    renders a new entry. Values are encoded as JSON, which is the same
+    in every process, other types are refused.
+    """
+    encoded = json.dumps(values, sort_keys=True, default=encode_value)
+    digest = hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+    return f'{scope}:{name}:{digest}'
+
+
+### BACKENDS ###
+
+class FragmentCache:
+    """
+    Stores rendered fragments. ttl is in seconds, None never expires.
+    """
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryFragmentCache(FragmentCache):
+    """
+    In-process cache, the least recently used fragments are evicted
+    past maxsize and expired ones are dropped when read.
+    """
+    def __init__(self, maxsize=1024) -> None:
+        self.entries = LRUCache(maxsize)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expires, value = entry
+        if expires is not None and time.monotonic() >= expires:
+            self.entries.remove(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        self.entries.set(key, (expires, value))
+
+    def clear(self):
+        self.entries.clear()
+
+
+class FileSystemFragmentCache(FragmentCache):
+    """
+    One file per fragment in directory, shared by every process using it.
+    The first line of a file holds its expiry time, the fragment follows.
+    Files are written to a temporary name then renamed, readers never
+    see half of a fragment.
+    """
+    SUFFIX = '.fragment'
+
+    def __init__(self, directory, encoding='utf-8') -> None:
+        self.directory = os.fspath(directory)
+        self.encoding = encoding
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + self.SUFFIX)
+
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            with open(path, encoding=self.encoding, newline='') as f:
+                expires = f.readline().strip()
+                value = f.read()
+        except FileNotFoundError:
+            return None
+
+        if expires and time.time() >= float(expires):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = repr(time.time() + ttl) if ttl else ''
+        fd, temporary = tempfile.mkstemp(dir=self.directory)
+        try:
+            with open(fd, 'w', encoding=self.encoding, newline='') as f:
+                f.write(expires + '\n')
+                f.write(value)
+            os.replace(temporary, self.get_path(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def clear(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith(self.SUFFIX):
+                os.remove(os.path.join(self.directory, filename))
+
+
+FRAGMENT_CACHE = MemoryFragmentCache()
+
+
+def set_fragment_cache(backend):
+    """
+    Replaces the backend {% cache %} fragments are stored in.
+    """
+    global FRAGMENT_CACHE
+    FRAGMENT_CACHE = backend
+
+
+def get_fragment(key):
+    return FRAGMENT_CACHE.get(key)
+
+
+def set_fragment(key, value, ttl=None):
+    FRAGMENT_CACHE.set(key, value, ttl)
@@ -0,0 +1,99 @@
+import threading
+from contextlib import contextmanager
+
+from .document import ROOT, Document, Expression
+from .utils import get_string_literal
+
+# Names of the templates being resolved by the current thread, to report
+# {% extends %} and {% include %} cycles instead of recursing forever.
+_resolving = threading.local()
+
+
+def is_block(node):
+    return isinstance(node, Expression) and node.command == 'block'
+
+
+def get_parent_name(table):
+    """
+    Name of the template a document extends, None if it doesn't.
+    {% extends %} has to be at the top level of the document.
+    """
+    for index in table.children(ROOT):
+        node = table.nodes[index]
+        if isinstance(node, Expression) and node.command == 'extends':
+            name = get_string_literal(node.expression_content)
+            if name is None:
+                raise SyntaxError(f'Expected a quoted template name after extends, got {node.expression_content}')
+            return name
+    return None
+
+
+def get_blocks(table):
+    """
+    Index of every {% block name %} of the table by name, nested ones included.
+    """
+    blocks = {}
+    for index in table.walk():
+        node = table.nodes[index]
+        if is_block(node):
+            name = node.expression_content
+            if name in blocks:
+                raise SyntaxError(f'Block {name} is defined twice')
+            blocks[name] = index
+    return blocks
+
+
+def copy_children(target, source, index, parent, blocks=None, blocks_source=None):
+    """
+    Appends the children of index in the source table, and their
+    descendants, under parent in the target table. Blocks named in
+    blocks are replaced by the block of the same name in blocks_source.
+    Node objects are shared, only their table rows are copied.
+    """
+    for child in source.children(index):
+        table, row = source, child
+        node = source.nodes[child]
+        if blocks and is_block(node) and node.expression_content in blocks:
+            table, row = blocks_source, blocks[node.expression_content]
+
+        copied = target.add(table.nodes[row], parent)
+        target.end[copied] = table.end[row]
+        copy_children(target, table, row, copied, blocks, blocks_source)
+
+
+def inherit(document, parent):
+    """
+    Flattened document: the parent's tree with the document's blocks.
+    Everything of the document outside its blocks is dropped.
+    """
+    flattened = Document(document.template, document.mode, document.name, document.loader)
+    copy_children(flattened.table, parent.table, ROOT, ROOT, get_blocks(document.table), document.table)
+    flattened.table.freeze()
+    return flattened
+
+
+def get_static_includes(table):
+    """
+    (index, name) of the {% include "name" %} of the table that are not
+    inlined yet. Included templates are not searched, their own includes
+    were inlined when they were built.
+    """
+    for index in table.walk():
+        node = table.nodes[index]
+        if isinstance(node, Expression) and node.command == 'include' and not table.has_children(index):
+            name = get_string_literal(node.expression_content)
+            if name is not None:
+                yield index, name
+
+
+@contextmanager
+def resolving(name):
+    names = _resolving.__dict__.setdefault('names', [])
+    if name is not None and name in names:
+        raise SyntaxError(f"Template {name} extends or includes itself: {' -> '.join(names + [name])}")
+
+    names.append(name)
+    try:
+        yield
+    finally:
+        names.pop()
@@ -0,0 +1,52 @@
+from collections import Counter, defaultdict
+
+# Phases reported to Hooks.phase. tokenize, parse and build (and compile,
+# for compiled templates) only happen when a template is not cached yet.
+PHASES = ('tokenize', 'parse', 'build', 'compile', 'render')
+
+# Counters reported to Hooks.counters after each render:
+#   tokens, nodes           size of the template
+#   loop_iterations         for iterations over all loops
+#   expression_evaluations  if/elif conditions evaluated
+#   variable_lookups        variables and for iterables read from the context
+COUNTERS = ('tokens', 'nodes', 'loop_iterations', 'expression_evaluations', 'variable_lookups')
+
+
+def new_counters(tokens=0, nodes=0):
+    counters = dict.fromkeys(COUNTERS, 0)
+    counters['tokens'] = tokens
+    counters['nodes'] = nodes
+    return counters
+
+
+class Hooks:
+    """
+    Receives the timings and counters of templates being built and
+    rendered. Subclass it and override what you need, then pass an
+    instance to render_to_string(..., hooks=hooks).
+
+    Times are time.perf_counter() values. Without hooks nothing is
+    measured nor counted.
+    """
+    def phase(self, template, phase, start, end):
+        pass
+
+    def counters(self, template, counters):
+        pass
+
+
+class Recorder(Hooks):
+    """
+    Keeps every phase duration and sums the counters of all renders.
+    """
+    def __init__(self) -> None:
+        self.timings = defaultdict(list)
+        self.totals = Counter()
+        self.renders = 0
+
+    def phase(self, template, phase, start, end):
+        self.timings[phase].append(end - start)
+
+    def counters(self, template, counters):
+        self.totals.update(counters)
+        self.renders += 1
@@ -0,0 +1,178 @@
+import os
+import time
+from threading import RLock
+
+from .utils import BASE_DIR
+
+# Seconds during which a looked-up template is trusted without touching
+# the filesystem. 0 checks the file on every lookup.
+DEFAULT_CHECK_INTERVAL = 2.0
+
+DEFAULT_SEARCH_PATH = os.path.join(os.path.dirname(BASE_DIR), 'templates')
+
+
+class TemplateNotFound(Exception):
+    def __init__(self, name) -> None:
+        super().__init__(f'Template {name} does not exist...')
+        self.name = name
+
+
+class BaseLoader:
+    """
+    Finds template sources by name.
+
+    get_signature(name) returns a hashable value that changes whenever
+    the template's source does, the template cache keys on it.
+    """
+    def get_signature(self, name):
+        raise NotImplementedError
+
+    def get_source(self, name):
+        raise NotImplementedError
+
+    def list_templates(self):
+        raise NotImplementedError
+
+    def __contains__(self, name):
+        try:
+            self.get_signature(name)
+        except TemplateNotFound:
+            return False
+        return True
+
+
+class FileSystemLoader(BaseLoader):
+    """
+    Loads templates from one or more directories, the first directory
+    holding a name wins. Names are paths relative to their directory,
+    with '/' separators ('partials/card.html').
+
+    The directories are walked once into an in-memory index. A template's
+    (mtime, size) is checked at most once every check_interval seconds,
+    in between lookups are answered from memory without any syscall.
+    Unknown names trigger a new walk, at most once per check_interval.
+    """
+    def __init__(self, search_paths=DEFAULT_SEARCH_PATH, check_interval=DEFAULT_CHECK_INTERVAL,
+                 encoding='utf-8') -> None:
+        if isinstance(search_paths, (str, os.PathLike)):
+            search_paths = [search_paths]
+
+        self.search_paths = [os.fspath(path) for path in search_paths]
+        self.check_interval = check_interval
+        self.encoding = encoding
+
+        self.index = {}
+        self.indexed_at = None
+        self.signatures = {}
+        self._lock = RLock()
+
+    def __getstate__(self):
+        # Templates holding their loader are sent to render_many workers
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = RLock()
+
+    def is_expired(self, checked_at, now):
+        return checked_at is None or now - checked_at >= self.check_interval
+
+    def build_index(self):
+        index = {}
+        for search_path in self.search_paths:
+            for directory, _, files in os.walk(search_path):
+                for filename in files:
+                    path = os.path.join(directory, filename)
+                    name = os.path.relpath(path, search_path).replace(os.sep, '/')
+                    index.setdefault(name, path)
+
+        with self._lock:
+            self.index = index
+            self.indexed_at = time.monotonic()
+            self.signatures.clear()
+
+    def get_path(self, name):
+        path = self.index.get(name)
+        if path is None and self.is_expired(self.indexed_at, time.monotonic()):
+            self.build_index()
+            path = self.index.get(name)
+
+        if path is None:
+            raise TemplateNotFound(name)
+        return path
+
+    def get_signature(self, name):
+        now = time.monotonic()
+        cached = self.signatures.get(name)
+        if cached is not None and not self.is_expired(cached[1], now):
+            return cached[0]
+
+        path = self.get_path(name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Deleted or moved since the last walk
+            self.build_index()
+            path = self.get_path(name)
+            stat = os.stat(path)
+
+        signature = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            self.signatures[name] = (signature, now)
+        return signature
+
+    def get_source(self, name):
+        with open(self.get_path(name), encoding=self.encoding) as f:
+            return f.read()
+
+    def list_templates(self):
+        if self.indexed_at is None:
+            self.build_index()
+        return sorted(self.index)
+
+
+class DictLoader(BaseLoader):
+    """
+    Serves templates from a {name: source} mapping, handy in tests.
+    """
+    def __init__(self, mapping) -> None:
+        self.mapping = mapping
+
+    def get_signature(self, name):
+        try:
+            # Strings cache their hash, keying on the source itself is cheap
+            return self.mapping[name]
+        except KeyError:
+            raise TemplateNotFound(name) from None
+
+    def get_source(self, name):
+        return self.get_signature(name)
+
+    def list_templates(self):
+        return sorted(self.mapping)
+
+
+class ChainLoader(BaseLoader):
+    """
+    Asks each loader in turn, the first one knowing the name wins.
+    """
+    def __init__(self, loaders) -> None:
+        self.loaders = list(loaders)
+
+    def get_loader(self, name):
+        for loader in self.loaders:
+            if name in loader:
+                return loader
+        raise TemplateNotFound(name)
+
+    def get_signature(self, name):
+        loader = self.get_loader(name)
+        return (id(loader), loader.get_signature(name))
+
+    def get_source(self, name):
+        return self.get_loader(name).get_source(name)
+
+    def list_templates(self):
+        return sorted(set().union(*(loader.list_templates() for loader in self.loaders)))
@@ -0,0 +1,234 @@
+from .document import (EXPRESSION_NODE, ROOT, STATIC_NODE, TAG_NODE, VARIABLE_NODE,
+                       Document, Expression, Output, Static)
+from .evaluate import VarAssignNode, compile_expression
+from .utils import (COMPACT, OUTPUT_MODES, PRESERVE, PRETTY, VARIABLE_PATTERN,
+                    get_leading_whitespace, get_string_literal)
+
+# Value of a condition that can only be known at render time
+UNKNOWN = object()
+
+BRANCH_COMMANDS = ('if', 'elif', 'else')
+
+
+def fold_condition(expression):
+    """
+    Value of the condition of an if/elif/else branch when it does not
+    read the context, UNKNOWN otherwise. Conditions that fail to
+    evaluate are left for the render to raise, as they did before.
+    """
+    if expression.command == 'else':
+        return True
+
+    try:
+        compiled = compile_expression(expression.expression_content)
+        if compiled.names or isinstance(compiled.ast, VarAssignNode):
+            return UNKNOWN
+        return bool(compiled.evaluate())
+    except Exception:
+        return UNKNOWN
+
+
+def copy_row(target, source, row, parent, node=None):
+    """
+    Appends the row of the source table under parent in the target
+    table. The depth is kept: it sets the row's indentation, which must
+    not change when the children of a removed node move up.
+    """
+    copied = target.add(node or source.nodes[row], parent)
+    target.depth[copied] = source.depth[row]
+    target.end[copied] = source.end[row]
+    return copied
+
+
+### CONSTANT FOLDING ###
+
+def get_chains(source, index):
+    """
+    Groups the children of index: an if with the elif/else branches
+    that follow it, or a single node.
+    """
+    chain = []
+    for child in source.children(index):
+        kind = source.kinds[child]
+        command = source.nodes[child].command if kind == EXPRESSION_NODE else None
+        continues_chain = chain and command in ('elif', 'else') and source.nodes[chain[-1]].command != 'else'
+        if chain and not continues_chain:
+            yield chain
+            chain = []
+
+        if command in BRANCH_COMMANDS:
+            chain.append(child)
+        else:
+            yield [child]
+
+    if chain:
+        yield chain
+
+
+def fold_chain(target, source, chain, parent):
+    """
+    Copies the branches of an if/elif/else chain whose condition is not
+    constantly false. The first constantly true branch becomes the else
+    of the chain, or replaces the whole chain by its children if no
+    branch before it is left.
+    """
+    kept = []
+    for branch in chain:
+        expression = source.nodes[branch]
+        value = fold_condition(expression)
+        if value is False:
+            continue
+
+        if value is True:
+            if not kept:
+                fold_children(target, source, branch, parent)
+                return
+            if expression.command != 'else':
+                expression = Expression('else', expression.start, expression.end)
+            kept.append((branch, expression))
+            break
+
+        if not kept and expression.command != 'if':
+            expression = Expression(f'if {expression.expression_content}', expression.start, expression.end)
+        kept.append((branch, expression))
+
+    for branch, expression in kept:
+        fold_children(target, source, branch, copy_row(target, source, branch, parent, expression))
+
+
+def fold_children(target, source, index, parent):
+    for chain in get_chains(source, index):
+        child = chain[0]
+        node = source.nodes[child]
+
+        if source.kinds[child] != EXPRESSION_NODE:
+            fold_children(target, source, child, copy_row(target, source, child, parent))
+
+        elif node.command in BRANCH_COMMANDS:
+            fold_chain(target, source, chain, parent)
+
+        elif node.command == 'block' or (node.command == 'include' and get_string_literal(node.expression_content) is not None):
+            # Only render their children
+            fold_children(target, source, child, parent)
+
+        elif node.command != 'extends':
+            fold_children(target, source, child, copy_row(target, source, child, parent))
+
+
+### SERIALIZATION ###
+
+class Serializer:
+    """
+    Writes the folded tree into the optimized table. Tags are turned
+    into text in the output mode once and for all: each run of markup
+    between two dynamic nodes becomes a single Static node, the
+    variables of their inner text Output nodes. Only expressions are
+    left of the tree, with the nodes they render as children.
+    """
+    def __init__(self, source, target, mode) -> None:
+        self.source = source
+        self.target = target
+        self.mode = mode
+        self.pending = []
+        self.run_start = self.run_end = 0
+
+    def write(self, text, index):
+        if text:
+            if not self.pending:
+                self.run_start = self.source.start[index]
+            self.pending.append(text)
+            self.run_end = self.source.end[index]
+
+    def flush(self, parent):
+        if self.pending:
+            self.target.add(Static(''.join(self.pending), self.run_start, self.run_end), parent)
+            self.pending = []
+
+    def get_whitespace(self, tag, index):
+        """
+        Whitespace written before the opening and the closing tag.
+        """
+        if self.mode == PRETTY:
+            tabulation = '\n' + '  ' * (self.source.depth[index] - 1)
+            return tabulation, tabulation
+        if self.mode == COMPACT:
+            return '', ''
+
+        # Preserve. Verbatim documents have no tags. The whitespace
+        # before the closing tag of a tag with inner text is part of it.
+        # Unclosed tags end with their opening tag.
+        closing = '' if tag.text_span else get_leading_whitespace(tag.source, tag.end)
+        return get_leading_whitespace(tag.source, tag.start), closing
+
+    def visit_tag(self, index, parent):
+        tag = self.source.nodes[index]
+        opening, closing = self.get_whitespace(tag, index)
+        self.write(opening + tag.opening(), index)
+
+        parts = VARIABLE_PATTERN.split(tag.raw_inner_text) if self.mode == PRESERVE else tag.get_inner_text_parts()
+        for position, part in enumerate(parts):
+            if position % 2:
+                self.flush(parent)
+                self.target.add(Output(part, self.source.start[index], self.source.end[index]), parent)
+            else:
+                self.write(part, index)
+
+        self.visit(index, parent)
+        self.write(closing + tag.closing(), index)
+
+    def has_inner_text(self, index):
+        return self.source.kinds[index] == TAG_NODE and self.source.nodes[index].text_span is not None
+
+    def visit(self, index, parent):
+        """
+        Serializes the children of index under parent.
+        """
+        for child in self.source.children(index):
+            kind = self.source.kinds[child]
+            if kind == VARIABLE_NODE:
+                # Variables of a tag's inner text are written by visit_tag,
+                # the others (under an expression, or next to other tags)
+                # on their own.
+                if not self.has_inner_text(index):
+                    self.flush(parent)
+                    self.target.add(Output(self.source.nodes[child].name, self.source.start[child],
+                                           self.source.end[child]), parent)
+            elif kind == TAG_NODE:
+                self.visit_tag(child, parent)
+            elif kind == STATIC_NODE:
+                # Text of a verbatim template, joined to the markup around it
+                self.write(self.source.nodes[child].text, child)
+            else:
+                self.flush(parent)
+                copied = copy_row(self.target, self.source, child, parent)
+                self.visit(child, copied)
+                self.flush(copied)
+
+
+def optimize(document, mode=PRETTY):
+    """
+    Document rendering the same output as the given one, with less work
+    per render:
+    - if/elif conditions that don't read the context are evaluated once,
+      their constantly false branches dropped;
+    - {% block %} and inlined {% include %} nodes are replaced by their
+      children, and {% extends %} nodes removed;
+    - tags are serialized in the output mode (see utils.OUTPUT_MODES):
+      the markup between two variables or expressions is written once,
+      as a single string. Verbatim documents have no tags, their text
+      nodes are only merged.
+    The given document is not modified: inheritance and includes copy
+    the nodes of the unoptimized one.
+    """
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode {mode}, expected one of {', '.join(OUTPUT_MODES)}")
+
+    folded = Document(document.template, name=document.name)
+    fold_children(folded.table, document.table, ROOT, ROOT)
+
+    optimized = Document(document.template, mode, document.name, document.loader)
+    serializer = Serializer(folded.table, optimized.table, mode)
+    serializer.visit(ROOT, ROOT)
+    serializer.flush(ROOT)
+    optimized.table.freeze()
+    return optimized
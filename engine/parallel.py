@@ -0,0 +1,74 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+import os
+
+from .engine import Template, get_compiled_template
+
+# Template of the current worker process, set once by init_worker
+WORKER_TEMPLATE = None
+
+
+def init_worker(template):
+    global WORKER_TEMPLATE
+    WORKER_TEMPLATE = template
+
+
+def render_chunk(start, contexts):
+    return start, [WORKER_TEMPLATE.render(context) for context in contexts]
+
+
+def get_chunks(contexts, chunksize):
+    iterator = iter(contexts)
+    start = 0
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def render_many(template, contexts, workers=None, chunksize=64, ordered=True):
+    """
+    Renders one template against many contexts over a process pool.
+    
+    The template is parsed and compiled once, then sent to each worker
+    when it starts. Contexts are consumed lazily, chunksize at a time,
+    with at most two chunks per worker in flight.
+    
+    Yields the rendered strings in the order of contexts if ordered
+    is true, else (index, rendered string) pairs as they complete.
+    """
+    if not isinstance(template, Template):
+        template = get_compiled_template(template)
+    template.compile()
+    
+    workers = workers or os.cpu_count() or 1
+    chunks = get_chunks(contexts, chunksize)
+    
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(template,)) as executor:
+        pending = set()
+        done_chunks = {}
+        next_start = 0
+        
+        def submit(count):
+            for start, chunk in islice(chunks, count):
+                pending.add(executor.submit(render_chunk, start, chunk))
+        
+        submit(workers * 2)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            pending -= done
+            
+            for future in done:
+                start, results = future.result()
+                if ordered:
+                    done_chunks[start] = results
+                else:
+                    yield from enumerate(results, start)
+                submit(1)
+            
+            while next_start in done_chunks:
+                results = done_chunks.pop(next_start)
+                next_start += len(results)
+                yield from results
@@ -1,7 +1,8 @@
-import copy
 import re
 import os
 
+from .cache import LRUCache
+
 
 
 ### CONSTANTS ###
@@ -12,130 +13,98 @@ LOGICAL_OPERATORS = ['==', '!=', '>', '<', '>=', '<=', 'and', 'or', 'not']
 SELF_CLOSING_TAGS = ['DOCTYPE','area', 'base', 'br', 'col', 'embed', 'hr', 'img','input', 'link', 'meta', 'param', 'source', 'track', 'wbr']
 
 
-### FUNCTIONS ###
+VARIABLE_PATTERN = re.compile(r'{{(.*?)}}')
+TAG_NAME_PATTERN = re.compile(r'\w+')
+HTML_ATTRIBUTES_PATTERN = re.compile(r"""([^\s]+-?\w+)=["']?((?:.(?!["']?\s+(?:\S+)=|\s*\/?[>"']))+.)["']?""")
 
-def add_tabulation_and_line_breaks(_string, tabulation=0):
-    """
-    Returns a string with tabulations and line breaks.
-    """
-    return '\n' + '  ' * tabulation + _string
+# Output modes: pretty re-indents every tag by its depth, preserve keeps
+# the whitespace written before each tag in the template, compact writes
+# tags with no whitespace between them. verbatim does not parse HTML:
+# the text around {{ }} and {% %} is copied from the template as is.
+PRETTY, PRESERVE, COMPACT, VERBATIM = 'pretty', 'preserve', 'compact', 'verbatim'
+OUTPUT_MODES = (PRETTY, PRESERVE, COMPACT, VERBATIM)
+
+MISSING = object()
+PATH_CACHE = LRUCache(maxsize=1024)
 
-def depth(_dict):
-    """
-    Returns a list of the depth of each key in a nested dictionary.
-    """
-    depth = []
-    stack = [(_dict, list(_dict.keys()))]
-    while stack:
-        cur, keys = stack.pop()
-        while keys:
-            k, keys = keys[0], keys[1:]
-            depth.append((k, len(stack) + 1))
-            v = cur[k]
-            if isinstance(v, dict):
-                stack.append((cur, keys))
-                stack.append((v, list(v.keys())))
-                break
-    return dict(depth)
 
+### FUNCTIONS ###
 
-def find_specific_key(desired_key, _dict):
+def get_indentation(depth, mode=PRETTY):
     """
-    Find specific key in nested dictionary.
+    Prefix of the lines of a template included at depth. Only pretty
+    output re-indents included templates.
     """
-    if desired_key in _dict: 
-        return _dict[desired_key]
-    
-    for val in _dict.values():
-        if isinstance(val, dict):
-            result = find_specific_key(desired_key, val)
-            if result is not None: 
-                return result
-            
-    return None
+    return '\n' + '  ' * depth if mode == PRETTY else ''
+
 
-def find_deepest_value(current_val):
+def get_leading_whitespace(source, offset):
     """
-    Find deepest value in nested dictionary.
+    The whitespace right before offset in source.
     """
-    if not any([isinstance(current_val.get(k), dict) for k in current_val]):
-        return current_val
-    else:
-        for dkey in current_val:
-            if isinstance(current_val.get(dkey), dict):
-                return find_deepest_value(current_val.get(dkey))
-            else:
-                continue
+    start = offset
+    while start > 0 and source[start - 1].isspace():
+        start -= 1
+    return source[start:offset]
 
 
 def get_html_tag_name(token):
     """
     Get the name of the HTML tag.
     """
-    return re.findall(r'\w+', token.content)[0]
+    return TAG_NAME_PATTERN.search(token.content).group()
 
 
 def get_html_attributes(token):
     """
     Get the attributes of the HTML tag (style, classes, id...).
     """
-    return re.findall(r"""([^\s]+-?\w+)=["']?((?:.(?!["']?\s+(?:\S+)=|\s*\/?[>"']))+.)["']?""", token.content)
+    return HTML_ATTRIBUTES_PATTERN.findall(token.content)
 
 
-def get_closing_expression_index(start_index, token, tokens, tag_name=None):
+def get_path_item(value, key, index):
     """
-    Get the closing expression index.
+    One step of a dotted path: dict key, list index or attribute.
     """
-    count, new_expression = start_index + 1, 0
-    
-    if token.specs == 'FOR':
-        while not all([tokens[count].specs == 'ENDFOR', new_expression <= 0]):
-            if tokens[count].specs == 'FOR':
-                new_expression += 1
-            elif tokens[count].specs == 'ENDFOR':
-                new_expression -= 1
-                
-            count += 1
-    
-    elif token.specs == 'IF':
-        while not all([tokens[count].specs == 'ENDIF', new_expression <= 0]):
-            if tokens[count].specs == 'ELIF' or tokens[count].specs == 'ELSE':
-                return count - 1
-            if tokens[count].specs == 'IF':
-                new_expression += 1
-            elif tokens[count].specs == 'ENDIF':
-                new_expression -= 1
-                
-            count += 1
-    
-    elif token.specs == 'BLOCK':
-        while not all([tokens[count].specs == 'ENDBLOCK', new_expression <= 0]):
-            if tokens[count].specs == 'BLOCK':
-                new_expression += 1
-            elif tokens[count].specs == 'ENDBLOCK':
-                new_expression -= 1
-                
-            count += 1
-    
-    return count
+    if isinstance(value, dict):
+        return value.get(key, MISSING)
+    if index is not None and isinstance(value, (list, tuple)):
+        return value[index] if -len(value) <= index < len(value) else MISSING
+    return getattr(value, key, MISSING)
 
-def get_closing_tag_index(start_index, tag_name, tokens):   
+
+def compile_path(path):
+    """
+    Turns a dotted path such as 'post.author.name' or 'posts.0.title'
+    into a function that reads it from a context, without copying it.
+    Compiled paths are cached per path string.
     """
-    Get the closing tag index.
-    """     
-    if tag_name in SELF_CLOSING_TAGS:
-        return False
+    resolver = PATH_CACHE.get(path)
+    if resolver is not None:
+        return resolver
+    
+    steps = tuple((key, int(key) if key.lstrip('-').isdigit() else None) for key in path.split('.'))
     
-    count, new_tag = start_index + 1, 0
+    def resolve(context, default=False):
+        value = context
+        for key, index in steps:
+            value = get_path_item(value, key, index)
+            if value is MISSING:
+                return default
+        return value
     
-    while not all([tokens[count].specs == '</%s>' % tag_name, new_tag <= 0]):
-        if '<%s' % tag_name in tokens[count].specs:
-            new_tag += 1
-        elif '</%s' % tag_name in tokens[count].specs:
-            new_tag -= 1
-        count += 1
+    PATH_CACHE.set(path, resolve)
+    return resolve
 
-    return count
+
+def get_string_literal(argument):
+    """
+    'base.html' out of '"base.html"', None when argument is not quoted.
+    """
+    argument = argument.strip()
+    if len(argument) >= 2 and argument[0] in '"\'' and argument[-1] == argument[0]:
+        return argument[1:-1]
+    return None
 
 
 class RetrieveVarsFromExpression:
@@ -187,20 +156,19 @@ class RetrieveVarsFromExpression:
         new_expression = ' '.join(new_expression)
         return new_expression    
 
-    def get_variable_from_context(self, variable, context):
-        variable = context.get(variable, False)
-        
-        if type(variable) == int:
-            variable = str(variable) 
-        
-        return variable
-    
     def is_mathematical_expression(self, var):
         return all([v in MATHEMATICAL_OPERATORS or v.isdigit() for v in var])
     
     def is_string(self, var):
         return all([var.startswith('"'), var.endswith('"')]) 
     
+    def lookup(self, var):
+        """
+        Native value of a (nested) variable, False if it is missing.
+        Unlike retrieve, numbers are not turned into strings.
+        """
+        return compile_path(var)(self.context)
+    
     def retrieve(self, var):
         if self.is_string(var):
             return var
@@ -209,18 +177,10 @@ class RetrieveVarsFromExpression:
         elif var in LOGICAL_OPERATORS:
             return None
         
-        current_var = var.split('.')
-                
-        if len(current_var) == 1:
-            variable = self.get_variable_from_context(current_var[0], self.context)
-            return variable
-
-        else:
-            count = 0
-            variable = copy.deepcopy(self.context)
-            while count != len(current_var):
-                variable = self.get_variable_from_context(current_var[count], variable)
-                count += 1
+        variable = compile_path(var)(self.context)
+        
+        if type(variable) == int:
+            variable = str(variable)
                 
         return variable
         
\ No newline at end of file
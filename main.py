@@ -21,3 +21,4 @@ def main():
 
 if __name__ == '__main__':
     rendered_string = main()
+    print(rendered_string)
@@ -2,20 +2,48 @@ import unittest
 
 from tests.test_document import TestDocument
 
+from .test_asynchronous import TestRenderAsync
+from .test_cache import TestLRUCache
 from .test_document import TestDocument
-from .test_engine import TestEngine
-from .test_evaluate import TestEvaluate
+from .test_engine import (TestCompiledTemplate, TestEngine, TestLexer, TestParser,
+                          TestStreaming, TestTemplate, TestThreadSafety)
+from .test_evaluate import TestCompiledExpression, TestEvaluate
+from .test_fragments import TestFragmentCache
+from .test_includes import TestIncludes
+from .test_inheritance import TestInheritance
+from .test_instrumentation import TestInstrumentation
+from .test_loaders import TestLoaders
+from .test_optimizer import TestOptimizer, TestOutputModes
+from .test_parallel import TestRenderMany
 
-from.test_utils import TestUtils
+from.test_utils import TestCompilePath, TestUtils
 
 
 def main():
     document = unittest.TestLoader().loadTestsFromTestCase(TestDocument)
     engine = unittest.TestLoader().loadTestsFromTestCase(TestEngine)
+    lexer = unittest.TestLoader().loadTestsFromTestCase(TestLexer)
+    parser = unittest.TestLoader().loadTestsFromTestCase(TestParser)
+    template = unittest.TestLoader().loadTestsFromTestCase(TestTemplate)
+    compiled = unittest.TestLoader().loadTestsFromTestCase(TestCompiledTemplate)
+    threads = unittest.TestLoader().loadTestsFromTestCase(TestThreadSafety)
+    streaming = unittest.TestLoader().loadTestsFromTestCase(TestStreaming)
     evaluate = unittest.TestLoader().loadTestsFromTestCase(TestEvaluate)
+    parallel = unittest.TestLoader().loadTestsFromTestCase(TestRenderMany)
+    asynchronous = unittest.TestLoader().loadTestsFromTestCase(TestRenderAsync)
+    expressions = unittest.TestLoader().loadTestsFromTestCase(TestCompiledExpression)
     utils = unittest.TestLoader().loadTestsFromTestCase(TestUtils)
+    paths = unittest.TestLoader().loadTestsFromTestCase(TestCompilePath)
+    cache = unittest.TestLoader().loadTestsFromTestCase(TestLRUCache)
+    loaders = unittest.TestLoader().loadTestsFromTestCase(TestLoaders)
+    instrumentation = unittest.TestLoader().loadTestsFromTestCase(TestInstrumentation)
+    fragments = unittest.TestLoader().loadTestsFromTestCase(TestFragmentCache)
+    inheritance = unittest.TestLoader().loadTestsFromTestCase(TestInheritance)
+    includes = unittest.TestLoader().loadTestsFromTestCase(TestIncludes)
+    optimizer = unittest.TestLoader().loadTestsFromTestCase(TestOptimizer)
+    output_modes = unittest.TestLoader().loadTestsFromTestCase(TestOutputModes)
     
-    suite = unittest.TestSuite([document, engine, evaluate, utils])
+    suite = unittest.TestSuite([document, engine, lexer, parser, template, compiled, streaming, threads, parallel, asynchronous, evaluate, expressions, utils, paths, cache, loaders, instrumentation, fragments, inheritance, includes, optimizer, output_modes])
     runner = unittest.TextTestRunner()
     runner.run(suite)
 
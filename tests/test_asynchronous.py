@@ -0,0 +1,78 @@
+import asyncio
+import unittest
+
+from engine.asynchronous import render_async, render_async_stream
+from engine.engine import Template
+
+
+class TestRenderAsync(unittest.TestCase):
+    SOURCE = (
+        '<div><h1>{{ user.name }}</h1>{% if user.admin %}<p>admin</p>{% else %}<p>member</p>{% endif %}'
+        '<ul>{% for post in posts %}<li>{{ post.title }}</li>{% endfor %}</ul></div>'
+    )
+    
+    def setUp(self):
+        self.template = Template(self.SOURCE)
+        self.posts = [{'title': f'post {i}'} for i in range(5)]
+        self.expected = self.template.render({'user': {'name': 'James', 'admin': True}, 'posts': self.posts})
+    
+    def test_awaitables_and_async_iterables(self):
+        async def get_name():
+            await asyncio.sleep(0.01)
+            return 'James'
+        
+        async def get_posts():
+            for post in self.posts:
+                await asyncio.sleep(0)
+                yield post
+        
+        context = {'user': {'name': get_name(), 'admin': True}, 'posts': get_posts()}
+        self.assertEqual(asyncio.run(render_async(self.template, context)), self.expected)
+    
+    def test_does_not_block_the_event_loop(self):
+        posts = [{'title': f'post {i}'} for i in range(5000)]
+        ticks = []
+        
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0)
+        
+        async def main():
+            task = asyncio.ensure_future(ticker())
+            chunks = [chunk async for chunk in render_async_stream(self.template, {'user': {}, 'posts': posts}, 1024)]
+            task.cancel()
+            return chunks
+        
+        chunks = asyncio.run(main())
+        self.assertGreater(len(chunks), 10)
+        self.assertGreater(len(ticks), 10)
+        self.assertEqual(''.join(chunks), self.template.render({'user': {}, 'posts': posts}))
+    
+    def test_async_iterables_give_control_back(self):
+        async def get_posts():
+            # Never suspends on its own
+            for i in range(1000):
+                yield i
+        
+        ticks = []
+        
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0)
+        
+        async def main():
+            task = asyncio.ensure_future(ticker())
+            await render_async(Template('<ul>{% for post in posts %}{% endfor %}</ul>'), {'posts': get_posts()})
+            task.cancel()
+        
+        asyncio.run(main())
+        self.assertGreaterEqual(len(ticks), 10)
+    
+    def test_errors_reach_the_caller(self):
+        async def fail():
+            raise ValueError('database is down')
+        
+        with self.assertRaises(ValueError):
+            asyncio.run(render_async(self.template, {'user': fail(), 'posts': []}))
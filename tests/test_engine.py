@@ -1,6 +1,233 @@
+import io
+import json
+import os
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.engine import (TEMPLATE_CACHE, Lexer, Parser, Template,
+                           get_compiled_template,
+                           get_template, render_to_file, render_to_stream,
+                           render_to_string)
+from engine.utils import BASE_DIR
+
+
+def get_context():
+    with open(os.path.join(os.path.dirname(BASE_DIR), 'data.json')) as f:
+        posts = json.load(f)
+        
+    return {
+        'title': 'forloop',
+        'test': {'name': 'James', 'age': 20, 'surname': 'Bond'},
+        'posts': posts,
+        'name': 'Bob',
+        'age': 20
+    }
+
 
 class TestEngine(unittest.TestCase):
     def test_engine(self):
         self.assertTrue()
-        
\ No newline at end of file
+
+
+def parse(source):
+    tokens = Lexer(source).tokenize()
+    return Parser(tokens, source).parse(tokens)
+
+
+def shape(nested):
+    return [(repr(node).strip(), shape(children)) for node, children in nested]
+
+
+class TestLexer(unittest.TestCase):
+    def test_tokens(self):
+        tokens = Lexer('<h1 class="a">{{ name }}</h1>{% if a %}{% endif %}').tokenize()
+        self.assertEqual(
+            [(token.type, token.content, token.index) for token in tokens],
+            [('TAG', '<h1 class="a">', 0), ('VARIABLE', ' name ', 15), ('TAG', '</h1>', 24),
+             ('EXPRESSION', ' if a ', 30), ('EXPRESSION', ' endif ', 40)],
+        )
+    
+    def test_exact_keywords(self):
+        tokens = Lexer('<form>{{ platform }}{% for a in b %}{% endfor %}{% elif c %}</form>').tokenize()
+        self.assertEqual(
+            [token.specs for token in tokens],
+            ['<form>', ' platform ', 'FOR', 'ENDFOR', 'ELIF', '</form>'],
+        )
+
+
+class TestParser(unittest.TestCase):
+    def test_nested_tags(self):
+        document = parse('<div><div><p>{{ a }}</p></div><p>b</p></div>')
+        self.assertEqual(shape(document.to_nested()), [
+            ('div', [('div', [('p', [('a', [])])]), ('p', [])]),
+        ])
+    
+    def test_branches_hold_all_their_children(self):
+        document = parse(
+            '<body>{% if a %}<p>1</p>{% elif b %}<p>2</p>'
+            '{% else %}<p>3</p><p>4</p>{% endif %}<p>5</p></body>'
+        )
+        self.assertEqual(shape(document.to_nested()), [('body', [
+            ('if a', [('p', [])]),
+            ('elif b', [('p', [])]),
+            ('else', [('p', []), ('p', [])]),
+            ('p', []),
+        ])])
+    
+    def test_nested_loops_and_self_closing_tags(self):
+        document = parse('{% for a in b %}<br>{% for c in a %}<img/>{% endfor %}{% endfor %}<hr>')
+        self.assertEqual(shape(document.to_nested()), [
+            ('for a in b', [('br', []), ('for c in a', [('img', [])])]),
+            ('hr', []),
+        ])
+    
+    def test_positions(self):
+        source = '<div><h1>{{ name }}</h1></div>'
+        table = parse(source).table
+        div_index = next(table.children())
+        div = table.nodes[div_index]
+        self.assertEqual((div.start, div.end), (0, source.index('</div>')))
+        self.assertEqual((table.start[div_index], table.end[div_index]), (div.start, div.end))
+        self.assertEqual(div.inner_text, '')
+        h1 = table.nodes[next(table.children(div_index))]
+        self.assertEqual(h1.inner_text, '{{ name }}')
+    
+    def test_inner_text_spans(self):
+        source = '<html><body><p> hi {{ a }} </p>{% if a %}<b>x</b>{% endif %}</body></html>'
+        table = parse(source).table
+        html, body, p = (table.nodes[index] for index in list(table.walk())[:3])
+        self.assertEqual(p.text_span, (source.index(' hi'), source.index('</p>')))
+        self.assertEqual(p.inner_text, 'hi {{ a }}')
+        self.assertIs(p.source, source)
+        for tag in (html, body):
+            self.assertIsNone(tag.text_span)
+            self.assertEqual(tag.inner_text, '')
+    
+    def test_node_table(self):
+        table = parse('<ul>{% for a in b %}<li>{{ a }}</li>{% endfor %}</ul><p>x</p>').table
+        self.assertEqual(len(table), 5)
+        self.assertEqual([repr(table.nodes[index]).strip() for index in table.walk()],
+                         ['ul', 'for a in b', 'li', 'a', 'p'])
+        self.assertEqual([table.depth[index] for index in table.walk()], [1, 2, 3, 4, 1])
+        self.assertEqual([table.parent[index] for index in table.walk()], [0, 1, 2, 3, 0])
+        self.assertEqual(list(table.children()), [1, 5])
+        self.assertEqual(list(table.walk(2)), [3, 4])
+
+
+class TestTemplate(unittest.TestCase):
+    def test_render_many_contexts(self):
+        template = Template('<div><h1>{{ name }}</h1></div>')
+        self.assertIn('<h1>James', template.render({'name': 'James'}))
+        self.assertIn('<h1>Bob', template.render({'name': 'Bob'}))
+    
+    def test_variables_are_written_in_place(self):
+        template = Template('<p>{{ second }} then {{ first }} then {{ second }}</p>')
+        self.assertEqual(template.render({'first': 1, 'second': 'two'}), '<p>two then 1 then two\n</p>')
+        
+        template = Template('<ul>{% for row in rows %}<li>{{ row.id }}</li>{% endfor %}</ul>')
+        result = template.render({'rows': [{'id': i} for i in range(3)]})
+        self.assertEqual(result.split(), ['<ul>', '<li>0', '</li>', '<li>1', '</li>', '<li>2', '</li>', '</ul>'])
+    
+    def test_compiled_template_is_cached(self):
+        TEMPLATE_CACHE.clear()
+        first = get_compiled_template('index.html')
+        second = get_compiled_template('index.html')
+        self.assertIs(first, second)
+        self.assertEqual(TEMPLATE_CACHE.stats().hits, 1)
+        self.assertEqual(TEMPLATE_CACHE.stats().misses, 1)
+    
+    def test_render_to_string(self):
+        result = render_to_string('index.html', get_context())
+        self.assertIn('<h2>Damn son ! qui est esse! Damn son!', result)
+
+
+class TestCompiledTemplate(unittest.TestCase):
+    def assertSameOutput(self, source, context):
+        expected = Template(source).render(context)
+        self.assertEqual(Template(source, compiled=True).render(context), expected)
+    
+    def test_index_matches_interpreter(self):
+        self.assertSameOutput(get_template('index.html'), get_context())
+    
+    def test_nested_loops_match_interpreter(self):
+        source = (
+            '<ul>{% for row in rows %}<li>{% for cell in row.cells %}'
+            '<span>{{ cell.value }}</span>{% endfor %}</li>{% endfor %}</ul>'
+        )
+        rows = [{'cells': [{'value': i * j} for j in range(3)]} for i in range(3)]
+        self.assertSameOutput(source, {'rows': rows})
+    
+    def test_branches(self):
+        source = (
+            '<div>{% if age > 18 %}<p>adult</p>{% elif age > 12 %}<p>teen</p>'
+            '{% else %}<p>child</p>{% endif %}</div>'
+        )
+        template = Template(source, compiled=True)
+        self.assertIn('<p>teen', template.render({'age': 15}))
+        self.assertIn('<p>child', template.render({'age': 5}))
+        self.assertNotIn('<p>teen', template.render({'age': 30}))
+    
+    def test_empty_variable(self):
+        for compiled in (False, True):
+            self.assertRaises(SyntaxError, Template, '<p>{{ }}</p>', compiled=compiled)
+            self.assertRaises(SyntaxError, Template, '{% for x in xs %}{{}}{% endfor %}', compiled=compiled)
+
+
+class TestStreaming(unittest.TestCase):
+    def test_stream_matches_render(self):
+        template = Template(get_template('index.html'))
+        expected = template.render(get_context())
+        for flush_size in (1, 64, 1 << 20):
+            chunks = list(render_to_stream(template, get_context(), flush_size))
+            self.assertEqual(''.join(chunks), expected)
+    
+    def test_chunks_follow_loop_iterations(self):
+        template = Template('<ul>{% for row in rows %}<li>{{ row.id }}</li>{% endfor %}</ul>')
+        rows = [{'id': i} for i in range(1000)]
+        chunks = list(render_to_stream(template, {'rows': rows}, flush_size=256))
+        self.assertGreater(len(chunks), 10)
+        self.assertTrue(all(len(chunk) < 512 for chunk in chunks))
+        self.assertEqual(''.join(chunks), template.render({'rows': rows}))
+    
+    def test_render_to_file(self):
+        fp = io.StringIO()
+        render_to_file('index.html', get_context(), fp, flush_size=16)
+        self.assertEqual(fp.getvalue(), render_to_string('index.html', get_context()))
+
+
+class TestThreadSafety(unittest.TestCase):
+    SOURCE = (
+        '<div>{% if user.admin %}<h1>Admin {{ user.name }}</h1>{% elif user.id > 5 %}'
+        '<h1>Member {{ user.name }}</h1>{% else %}<h1>Guest</h1>{% endif %}'
+        '<ul>{% for post in user.posts %}<li>{% if post.id > 0 %}<b>{{ post.title }}</b>'
+        '{% else %}<i>{{ post.title }}</i>{% endif %}</li>{% endfor %}</ul>'
+        '{% if user.id > 3 %}<p>second chain</p>{% else %}<p>no second chain</p>{% endif %}</div>'
+    )
+    
+    def make_context(self, index):
+        return {'user': {
+            'id': index % 10,
+            'admin': index % 7 == 0,
+            'name': f'user {index}',
+            'posts': [{'id': i, 'title': f'post {index}-{i}'} for i in range(index % 5)],
+        }}
+    
+    def test_nested_chains(self):
+        result = Template(self.SOURCE).render(self.make_context(7))
+        self.assertIn('Admin user 7', result)
+        self.assertNotIn('Member', result)
+        self.assertIn('<i>post 7-0', result)
+        self.assertIn('<b>post 7-1', result)
+        self.assertIn('<p>second chain', result)
+    
+    def test_concurrent_renders(self):
+        for compiled in (False, True):
+            template = Template(self.SOURCE, compiled=compiled)
+            contexts = [self.make_context(index) for index in range(640)]
+            expected = [template.render(context) for context in contexts]
+            
+            with ThreadPoolExecutor(max_workers=32) as executor:
+                results = list(executor.map(template.render, contexts))
+            
+            self.assertEqual(results, expected)
+            self.assertEqual(len(set(results)), len(set(expected)))
@@ -1,5 +1,80 @@
 import unittest
 
+from engine.engine import Template
+from engine.evaluate import EXPRESSION_CACHE, INTEGER, Token, compile_expression, evaluate
+
+
 class TestEvaluate(unittest.TestCase):
     def test_engine(self):
-        self.assertTrue()
\ No newline at end of file
+        self.assertTrue()
+
+
+class TestCompiledExpression(unittest.TestCase):
+    def test_evaluate(self):
+        self.assertEqual(evaluate('(2*5) + 2'), 12)
+        self.assertFalse(evaluate('10+10 * (4/2) == 10'))
+    
+    def test_bindings(self):
+        expression = compile_expression('post.id > 1')
+        self.assertEqual(expression.names, ('post.id',))
+        self.assertFalse(expression.evaluate({'post.id': 1}))
+        self.assertTrue(expression.evaluate({'post.id': 2}))
+        self.assertTrue(compile_expression('name == "Bob"').evaluate({'name': 'Bob'}))
+    
+    def test_expressions_are_parsed_once(self):
+        EXPRESSION_CACHE.clear()
+        self.assertIs(compile_expression('1 + 1'), compile_expression('1 + 1'))
+        
+        template = Template('<ul>{% for row in rows %}{% if row.id > 50 %}<li>{{ row.id }}</li>{% endif %}{% endfor %}</ul>')
+        template.render({'rows': [{'id': i} for i in range(100)]})
+        self.assertIn('row.id > 50', EXPRESSION_CACHE)
+        self.assertEqual(EXPRESSION_CACHE.stats().misses, 2)
+    
+    def test_closures_match_interpreter(self):
+        expressions = ['1 + 2 - 3', '(2*5) + 2 / 4', '-(2 + 3) * +4', '2 ^ 3 ^ 2', '1 < 2 AND 3 >= 3 OR 0']
+        for text in expressions:
+            compiled = compile_expression(text)
+            self.assertEqual(compiled.evaluate(), compiled.interpret())
+        
+        compiled = compile_expression('post.id * 2 > limit')
+        self.assertEqual(compiled.evaluate({'post.id': 21, 'limit': 40}), compiled.interpret({'post.id': 21, 'limit': 40}))
+    
+    def test_native_values(self):
+        for text, bindings, expected in [
+            ('1 < 2', None, True),
+            ('"a" + "b" == "ab"', None, True),
+            ('"say \\"hi\\""', None, 'say "hi"'),
+            ('NOT draft AND 2 * 1.5', {'draft': 0}, 3.0),
+            ('null OR name', {'name': 'Bob'}, 'Bob'),
+        ]:
+            compiled = compile_expression(text)
+            self.assertEqual(compiled.evaluate(bindings), expected)
+            self.assertEqual(compiled.interpret(bindings), expected)
+            self.assertIs(type(compiled.interpret(bindings)), type(expected))
+        self.assertFalse(hasattr(Token(1, INTEGER), '__dict__'))
+    
+    def test_type_rules(self):
+        for text, bindings in [('"a" - 1', None), ('name < 1', {'name': 'Bob'}), ('1.5 * name', {'name': 'Bob'})]:
+            compiled = compile_expression(text)
+            self.assertRaises(TypeError, compiled.evaluate, bindings)
+            self.assertRaises(TypeError, compiled.interpret, bindings)
+        self.assertEqual(evaluate('"ab" * 2'), 'abab')
+        self.assertEqual(compile_expression('items * 2').interpret({'items': [1]}), [1, 1])
+        self.assertRaises(NameError, compile_expression('missing > 1').interpret)
+        
+        compiled = compile_expression('-name')
+        errors = []
+        for run in (compiled.evaluate, compiled.interpret):
+            with self.assertRaises(TypeError) as raised:
+                run({'name': 'Bob'})
+            errors.append(str(raised.exception))
+        self.assertEqual(errors[0], errors[1])
+        self.assertEqual(compiled.evaluate({'name': 2.5}), -2.5)
+    
+    def test_assignments_stay_in_bindings(self):
+        compiled = compile_expression('VAR total = 1 + 2')
+        for run in (compiled.evaluate, compiled.interpret):
+            bindings = {}
+            self.assertEqual(run(bindings), 3)
+            self.assertEqual(bindings, {'total': 3})
+            self.assertRaises(NameError, evaluate, 'total')
@@ -0,0 +1,118 @@
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+from engine import fragments
+from engine.asynchronous import render_async
+from engine.engine import Lexer, Template, render_to_stream
+from engine.fragments import (FileSystemFragmentCache, MemoryFragmentCache,
+                              parse_cache_arguments, set_fragment_cache)
+
+SOURCE = (
+    '<nav>{% cache "menu" user.id 60 %}<ul>{% for link in links %}<li>{{ link.title }}</li>{% endfor %}</ul>'
+    '{% endcache %}</nav>'
+)
+
+
+def get_context(user_id=1, titles=('Home', 'Blog')):
+    return {'user': {'id': user_id}, 'links': [{'title': title} for title in titles]}
+
+
+class TestFragmentCache(unittest.TestCase):
+    def setUp(self):
+        set_fragment_cache(MemoryFragmentCache())
+
+    def tearDown(self):
+        set_fragment_cache(MemoryFragmentCache())
+
+    def test_parse_arguments(self):
+        self.assertEqual(parse_cache_arguments('"menu" user.id lang 300'), ('menu', ('user.id', 'lang'), 300))
+        self.assertEqual(parse_cache_arguments("'sidebar'"), ('sidebar', (), None))
+        self.assertRaises(SyntaxError, parse_cache_arguments, 'footer 0')
+        self.assertRaises(SyntaxError, Template('<p>{% cache "footer" 0 %}{% endcache %}</p>').render, {})
+        self.assertRaises(SyntaxError, Template, '<p>{% cache "footer" 0 %}{% endcache %}</p>', compiled=True)
+
+    def test_fragments_are_scoped(self):
+        sources = ['<p>{% cache "side" %}<b>one</b>{% endcache %}</p>',
+                   '<p>{% cache "side" %}<i>two</i>{% endcache %}</p>']
+        for compiled in (False, True):
+            set_fragment_cache(MemoryFragmentCache())
+            self.assertIn('<b>one', Template(sources[0], compiled=compiled).render({}))
+            self.assertIn('<i>two', Template(sources[1], compiled=compiled).render({}))
+            self.assertEqual(Template(sources[0], compiled=compiled, mode='compact').render({}), '<p><b>one</b></p>')
+
+    def test_fragment_values(self):
+        key = fragments.make_fragment_key('scope', 'menu', ({'b': 1, 'a': [True, None]},))
+        self.assertEqual(key, fragments.make_fragment_key('scope', 'menu', ({'a': [True, None], 'b': 1},)))
+        for compiled in (False, True):
+            self.assertRaises(TypeError, Template(SOURCE, compiled=compiled).render, get_context(user_id=object()))
+
+    def test_block_matching(self):
+        tokens = Lexer(SOURCE).tokenize()
+        self.assertEqual(tokens[1].specs, 'CACHE')
+
+        table = Template(SOURCE).document.table
+        cache = next(table.children(next(table.children())))
+        self.assertEqual(table.nodes[cache].command, 'cache')
+        self.assertEqual(len(list(table.children(cache))), 1)
+
+    def test_fragment_is_reused(self):
+        for compiled in (False, True):
+            set_fragment_cache(MemoryFragmentCache())
+            template = Template(SOURCE, compiled=compiled)
+            first = template.render(get_context())
+            self.assertIn('Blog', first)
+
+            # The links changed but the key did not: the cached fragment is used
+            self.assertEqual(template.render(get_context(titles=('Other',))), first)
+
+            # Another user gets its own fragment
+            self.assertIn('Other', template.render(get_context(user_id=2, titles=('Other',))))
+
+    def test_backends_agree(self):
+        renders = [
+            lambda: Template(SOURCE).render(get_context()),
+            lambda: Template(SOURCE, compiled=True).render(get_context()),
+            lambda: ''.join(render_to_stream(Template(SOURCE), get_context(), flush_size=1)),
+            lambda: asyncio.run(render_async(Template(SOURCE), get_context())),
+        ]
+        outputs = set()
+        for render in renders:
+            # Each backend renders the fragment itself
+            set_fragment_cache(MemoryFragmentCache())
+            outputs.add(render())
+        self.assertEqual(len(outputs), 1)
+
+    def test_memory_ttl(self):
+        cache = MemoryFragmentCache(maxsize=2)
+        with mock.patch('time.monotonic', return_value=100.0):
+            cache.set('a', 'A', ttl=10)
+            cache.set('b', 'B')
+        with mock.patch('time.monotonic', return_value=109.0):
+            self.assertEqual(cache.get('a'), 'A')
+        with mock.patch('time.monotonic', return_value=110.0):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), 'B')
+
+        cache.set('c', 'C')
+        cache.set('d', 'D')
+        self.assertIsNone(cache.get('b'))
+
+    def test_filesystem_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FileSystemFragmentCache(directory)
+            cache.set('menu:1', '<ul>\r\n</ul>')
+            cache.set('menu:2', 'old', ttl=5)
+            self.assertEqual(FileSystemFragmentCache(directory).get('menu:1'), '<ul>\r\n</ul>')
+
+            with mock.patch('time.time', return_value=fragments.time.time() + 10):
+                self.assertIsNone(cache.get('menu:2'))
+            self.assertIsNone(cache.get('missing'))
+
+            set_fragment_cache(cache)
+            first = Template(SOURCE).render(get_context())
+            self.assertEqual(Template(SOURCE, compiled=True).render(get_context(titles=())), first)
+
+            cache.clear()
+            self.assertIsNone(cache.get('menu:1'))
@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from engine import engine
+from engine.asynchronous import render_async
+from engine.engine import Template, get_compiled_template
+from engine.loaders import DictLoader, FileSystemLoader
+
+TEMPLATES = {
+    'card.html': '<div class="card"><h2>{{ post.title }}</h2></div>',
+    'row.html': '<tr><td>{{ post.title }}</td></tr>',
+    'static.html': '<section>{% for post in posts %}{% include "card.html" %}{% endfor %}</section>',
+    'dynamic.html': '<section>{% for post in posts %}{% include post.partial %}{% endfor %}</section>',
+    'page.html': '{% extends "layout.html" %}{% block content %}{% include "card.html" %}{% endblock %}',
+    'layout.html': '<html><body>{% block content %}{% endblock %}{% include "footer.html" %}</body></html>',
+    'footer.html': '<footer>bye</footer>',
+}
+
+
+def get_context(partial='card.html'):
+    posts = [{'title': 'first', 'partial': partial}, {'title': 'second', 'partial': partial}]
+    return {'posts': posts, 'post': {'title': 'main'}}
+
+
+class TestIncludes(unittest.TestCase):
+    def setUp(self):
+        self.templates = dict(TEMPLATES)
+        engine.set_loader(DictLoader(self.templates))
+
+    def tearDown(self):
+        engine.set_loader(FileSystemLoader())
+
+    def test_static_include_is_inlined(self):
+        template = get_compiled_template('static.html')
+        self.assertEqual(set(template.dependencies), {'card.html'})
+        self.assertEqual(template.render(get_context()).split(), [
+            '<section>',
+            '<div', 'class="card">', '<h2>first', '</h2>', '</div>',
+            '<div', 'class="card">', '<h2>second', '</h2>', '</div>',
+            '</section>',
+        ])
+
+    def test_dynamic_include_matches_static(self):
+        expected = get_compiled_template('static.html').render(get_context())
+        for compiled in (False, True):
+            self.assertEqual(engine.render_to_string('dynamic.html', get_context(), compiled=compiled), expected)
+        self.assertIn('<tr>', engine.render_to_string('dynamic.html', get_context('row.html')))
+
+    def test_dynamic_include_uses_the_template_loader(self):
+        engine.set_loader(DictLoader({}))
+        loader = DictLoader(self.templates)
+        expected = Template(self.templates['static.html'], loader=loader).render(get_context())
+        for compiled in (False, True):
+            template = Template(self.templates['dynamic.html'], compiled=compiled, loader=loader)
+            self.assertEqual(template.render(get_context()), expected)
+        self.assertEqual(asyncio.run(render_async(Template(self.templates['dynamic.html'], loader=loader), get_context())),
+                         expected)
+
+    def test_includes_are_parsed_once(self):
+        # The first render loads card.html, the next ones only hit the cache
+        engine.render_to_string('dynamic.html', get_context())
+        with mock.patch.object(engine, 'Lexer', side_effect=AssertionError):
+            for compiled in (False, True):
+                context = dict(get_context(), posts=[{'title': i, 'partial': 'card.html'} for i in range(50)])
+                engine.render_to_string('dynamic.html', context, compiled=compiled)
+
+    def test_includes_with_inheritance(self):
+        template = get_compiled_template('page.html')
+        self.assertEqual(set(template.dependencies), {'layout.html', 'footer.html', 'card.html'})
+        self.assertEqual(template.render(get_context()).split(), [
+            '<html>', '<body>', '<div', 'class="card">', '<h2>main', '</h2>', '</div>',
+            '<footer>bye', '</footer>', '</body>', '</html>',
+        ])
+        self.assertEqual(Template(self.templates['page.html'], compiled=True).render(get_context()),
+                         template.render(get_context()))
+
+    def test_changed_partial_invalidates_parent(self):
+        first = get_compiled_template('page.html')
+        self.templates['footer.html'] = '<footer>see you</footer>'
+        second = get_compiled_template('page.html')
+        self.assertIsNot(second, first)
+        self.assertIn('see you', second.render(get_context()))
+
+    def test_recursive_include(self):
+        self.templates['loop.html'] = '<div>{% include "loop.html" %}</div>'
+        self.assertRaises(SyntaxError, get_compiled_template, 'loop.html')
@@ -0,0 +1,72 @@
+import unittest
+
+from engine import engine
+from engine.engine import TEMPLATE_CACHE, Template, get_compiled_template
+from engine.loaders import DictLoader, FileSystemLoader
+
+TEMPLATES = {
+    'base.html': '<html><body>{% block content %}<p>empty</p>{% endblock %}<footer>foot</footer></body></html>',
+    'page.html': (
+        '{% extends "base.html" %}<p>outside of any block</p>'
+        '{% block content %}<h1>{{ title }}</h1>{% block inner %}<p>inner</p>{% endblock %}{% endblock %}'
+    ),
+    'sub.html': '{% extends "page.html" %}{% block inner %}<p>sub {{ title }}</p>{% endblock %}',
+}
+
+
+def words(text):
+    return text.split()
+
+
+class TestInheritance(unittest.TestCase):
+    def setUp(self):
+        self.templates = dict(TEMPLATES)
+        engine.set_loader(DictLoader(self.templates))
+
+    def tearDown(self):
+        engine.set_loader(FileSystemLoader())
+
+    def render(self, name, compiled=False):
+        return engine.render_to_string(name, {'title': 'Hello'}, compiled=compiled)
+
+    def test_blocks_are_overridden(self):
+        self.assertEqual(words(self.render('base.html')),
+                         ['<html>', '<body>', '<p>empty', '</p>', '<footer>foot', '</footer>', '</body>', '</html>'])
+        self.assertEqual(words(self.render('page.html')), [
+            '<html>', '<body>', '<h1>Hello', '</h1>', '<p>inner', '</p>',
+            '<footer>foot', '</footer>', '</body>', '</html>',
+        ])
+        self.assertEqual(words(self.render('sub.html')), [
+            '<html>', '<body>', '<h1>Hello', '</h1>', '<p>sub', 'Hello', '</p>',
+            '<footer>foot', '</footer>', '</body>', '</html>',
+        ])
+
+    def test_compiled_matches_interpreter(self):
+        for name in TEMPLATES:
+            self.assertEqual(self.render(name, compiled=True), self.render(name))
+
+    def test_parent_is_not_modified(self):
+        before = self.render('base.html')
+        self.render('sub.html')
+        self.assertEqual(self.render('base.html'), before)
+
+    def test_flattened_once(self):
+        TEMPLATE_CACHE.clear()
+        template = get_compiled_template('sub.html')
+        self.assertEqual(set(template.dependencies), {'page.html', 'base.html'})
+        self.assertIs(get_compiled_template('sub.html'), template)
+
+    def test_changed_parent_invalidates_children(self):
+        first = get_compiled_template('sub.html')
+        self.templates['base.html'] = self.templates['base.html'].replace('foot', 'new footer')
+
+        second = get_compiled_template('sub.html')
+        self.assertIsNot(second, first)
+        self.assertIn('new footer', second.render({'title': 'Hello'}))
+
+    def test_errors(self):
+        self.templates['a.html'] = '{% extends "b.html" %}'
+        self.templates['b.html'] = '{% extends "a.html" %}'
+        self.assertRaises(SyntaxError, get_compiled_template, 'a.html')
+        self.assertRaises(SyntaxError, Template, '{% extends base %}')
+        self.assertRaises(SyntaxError, Template, '{% extends "base.html" %}{% block a %}{% endblock %}{% block a %}{% endblock %}')
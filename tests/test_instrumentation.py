@@ -0,0 +1,55 @@
+import unittest
+
+from engine import engine
+from engine.engine import Template
+from engine.instrumentation import COUNTERS, Hooks, Recorder
+from engine.loaders import DictLoader, FileSystemLoader
+
+SOURCE = (
+    '<ul>{% for row in rows %}<li><span>{{ row.name }}</span>'
+    '{% if row.id == 0 %}<b>first</b>{% elif row.id == 1 %}<i>second</i>{% else %}<p>other</p>{% endif %}'
+    '</li>{% endfor %}</ul>'
+)
+CONTEXT = {'rows': [{'id': i, 'name': f'row {i}'} for i in range(4)]}
+
+
+class TestInstrumentation(unittest.TestCase):
+    def tearDown(self):
+        engine.set_loader(FileSystemLoader())
+
+    def test_counters(self):
+        for compiled in (False, True):
+            recorder = Recorder()
+            template = Template(SOURCE, compiled=compiled)
+            self.assertEqual(template.render(CONTEXT, recorder), template.render(CONTEXT))
+
+            self.assertEqual(recorder.renders, 1)
+            self.assertEqual(set(recorder.totals), set(COUNTERS))
+            self.assertEqual(recorder.totals['tokens'], 19)
+            self.assertEqual(recorder.totals['nodes'], 11)
+            self.assertEqual(recorder.totals['loop_iterations'], 4)
+            # Row 0 stops at the if, the other rows evaluate the elif too
+            self.assertEqual(recorder.totals['expression_evaluations'], 7)
+            self.assertEqual(recorder.totals['variable_lookups'], 5)
+            self.assertEqual(len(recorder.timings['render']), 1)
+
+    def test_render_to_string_phases(self):
+        phases = []
+
+        class Phases(Hooks):
+            def phase(self, template, phase, start, end):
+                phases.append((template, phase))
+                durations.append(end - start)
+
+        durations = []
+        engine.set_loader(DictLoader({'list.html': SOURCE}))
+
+        engine.render_to_string('list.html', CONTEXT, compiled=True, hooks=Phases())
+        self.assertEqual([phase for _, phase in phases], ['tokenize', 'parse', 'build', 'compile', 'render'])
+        self.assertEqual({template for template, _ in phases}, {'list.html'})
+        self.assertTrue(all(duration >= 0 for duration in durations))
+
+        # Cached: only the render is left
+        phases.clear()
+        engine.render_to_string('list.html', CONTEXT, compiled=True, hooks=Phases())
+        self.assertEqual(phases, [('list.html', 'render')])
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from engine import engine
+from engine.loaders import (ChainLoader, DictLoader, FileSystemLoader,
+                            TemplateNotFound)
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+class TestLoaders(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.first = os.path.join(self.directory.name, 'first')
+        self.second = os.path.join(self.directory.name, 'second')
+        write(os.path.join(self.first, 'index.html'), '<h1>first</h1>')
+        write(os.path.join(self.second, 'index.html'), '<h1>second</h1>')
+        write(os.path.join(self.second, 'partials', 'card.html'), '<p>card</p>')
+
+    def tearDown(self):
+        self.directory.cleanup()
+        engine.set_loader(FileSystemLoader())
+
+    def test_search_paths_order(self):
+        loader = FileSystemLoader([self.first, self.second])
+        self.assertEqual(loader.get_source('index.html'), '<h1>first</h1>')
+        self.assertEqual(loader.get_source('partials/card.html'), '<p>card</p>')
+        self.assertEqual(loader.list_templates(), ['index.html', 'partials/card.html'])
+        self.assertRaises(TemplateNotFound, loader.get_source, 'missing.html')
+
+    def test_steady_state_lookups_skip_the_filesystem(self):
+        loader = FileSystemLoader([self.first], check_interval=60)
+        signature = loader.get_signature('index.html')
+
+        with mock.patch('os.stat', side_effect=AssertionError), \
+             mock.patch('os.walk', side_effect=AssertionError):
+            for _ in range(100):
+                self.assertEqual(loader.get_signature('index.html'), signature)
+            self.assertRaises(TemplateNotFound, loader.get_signature, 'missing.html')
+
+    def test_change_detection(self):
+        loader = FileSystemLoader([self.first], check_interval=0)
+        path = os.path.join(self.first, 'index.html')
+        signature = loader.get_signature('index.html')
+
+        write(path, '<h1>edited</h1>')
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        self.assertNotEqual(loader.get_signature('index.html'), signature)
+
+        write(os.path.join(self.first, 'new.html'), '<p>new</p>')
+        self.assertEqual(loader.get_source('new.html'), '<p>new</p>')
+
+        os.remove(path)
+        self.assertRaises(TemplateNotFound, loader.get_signature, 'index.html')
+
+    def test_dict_and_chain_loaders(self):
+        mapping = {'index.html': '<h1>dict</h1>'}
+        loader = ChainLoader([DictLoader(mapping), FileSystemLoader([self.second])])
+        self.assertEqual(loader.get_source('index.html'), '<h1>dict</h1>')
+        self.assertEqual(loader.get_source('partials/card.html'), '<p>card</p>')
+        self.assertIn('partials/card.html', loader)
+        self.assertNotIn('missing.html', loader)
+
+        signature = loader.get_signature('index.html')
+        mapping['index.html'] = '<h1>changed</h1>'
+        self.assertNotEqual(loader.get_signature('index.html'), signature)
+
+    def test_render_with_loader(self):
+        mapping = {'page.html': '<h1>{{ name }}</h1>'}
+        engine.set_loader(DictLoader(mapping))
+        self.assertEqual(engine.render_to_string('page.html', {'name': 'James'}), '<h1>James\n</h1>')
+        self.assertIs(engine.get_compiled_template('page.html'), engine.get_compiled_template('page.html'))
+
+        mapping['page.html'] = '<h2>{{ name }}</h2>'
+        self.assertEqual(engine.render_to_string('page.html', {'name': 'Bob'}), '<h2>Bob\n</h2>')
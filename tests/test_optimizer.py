@@ -0,0 +1,148 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from engine import compiler
+from engine.asynchronous import render_async
+from engine.document import STATIC_NODE, TAG_NODE
+from engine import engine
+from engine.engine import Interpreter, Template, render_to_stream, set_output_mode
+from engine.loaders import DictLoader, FileSystemLoader
+from engine.utils import OUTPUT_MODES
+
+PAGE = (
+    '<html><head><title>Page</title><meta charset="utf-8"></head><body>'
+    '{% if 10+10 * (4/2) == 10 %}<p>never</p>{% elif 2 > 1 %}<p>always</p>{% else %}<p>else</p>{% endif %}'
+    '{% if 0 %}<b>no</b>{% elif user.admin %}<b>admin</b>{% elif 1 %}<b>user</b>{% elif user.guest %}<b>guest</b>{% endif %}'
+    '<ul>{% for post in posts %}<li>{{ post.title }}</li><hr>{% endfor %}</ul>'
+    '</body></html>'
+)
+
+
+def get_context(admin=False):
+    return {'user': {'admin': admin, 'guest': True}, 'posts': [{'title': 'first'}, {'title': 'second'}]}
+
+
+def shape(table, index=0):
+    return [(repr(table.nodes[child]) if table.kinds[child] != STATIC_NODE else 'static', shape(table, child))
+            for child in table.children(index)]
+
+
+class TestOptimizer(unittest.TestCase):
+    def test_same_output(self):
+        template = Template(PAGE)
+        for admin in (False, True):
+            expected = Interpreter(template.optimized, get_context(admin)).document_string
+            self.assertEqual(template.render(get_context(admin)), expected)
+            self.assertEqual(Template(PAGE, mode='compact').render(get_context(admin)), (
+                '<html><head><title>Page</title><meta charset="utf-8"></head><body><p>always</p>'
+                f'<b>{"admin" if admin else "user"}</b><ul><li>first</li><hr><li>second</li><hr></ul></body></html>'
+            ))
+            self.assertEqual(Template(PAGE, compiled=True).render(get_context(admin)), expected)
+            self.assertEqual(''.join(render_to_stream(template, get_context(admin), flush_size=1)), expected)
+            self.assertEqual(asyncio.run(render_async(template, get_context(admin))), expected)
+
+    def test_folded_tree(self):
+        table = Template(PAGE).optimized.table
+        self.assertEqual(shape(table), [
+            ('static', []),
+            ('if user.admin', [('static', [])]),
+            ('else', [('static', [])]),
+            ('static', []),
+            ('for post in posts', [('static', []), ('{{ post.title }}', []), ('static', [])]),
+            ('static', []),
+        ])
+        self.assertIn('<title>Page\n    </title>', table.nodes[1].text)
+        self.assertIn('<p>always', table.nodes[1].text)
+        # The unoptimized tree is kept for inheritance and includes
+        self.assertIn('if 10+10 * (4/2) == 10', [repr(node) for node in Template(PAGE).document.table.nodes])
+
+    def test_constant_conditions_are_not_evaluated(self):
+        template = Template(PAGE, compiled=True)
+        with mock.patch.object(compiler, 'evaluate_condition', return_value=False) as evaluate_condition:
+            template.render(get_context())
+        self.assertEqual([call.args[0] for call in evaluate_condition.call_args_list], ['user.admin'])
+
+    def test_errors_are_left_to_the_render(self):
+        template = Template('<p>{% if 1 / 0 %}<b>x</b>{% endif %}</p>')
+        self.assertRaises(ZeroDivisionError, template.render, {})
+
+
+class TestOutputModes(unittest.TestCase):
+    SOURCE = '<ul>\n  <li> {{ name }} </li>\n  {% if admin %}<li>admin</li>{% endif %}\n</ul>'
+
+    def tearDown(self):
+        set_output_mode('pretty')
+        engine.set_loader(FileSystemLoader())
+
+    def test_modes(self):
+        context = {'name': 'Bob', 'admin': True}
+        self.assertEqual(Template(self.SOURCE).render(context),
+                         '<ul>\n  <li>Bob\n  </li>\n    <li>admin\n    </li>\n</ul>')
+        self.assertEqual(Template(self.SOURCE, mode='preserve').render(context),
+                         '<ul>\n  <li> Bob </li><li>admin</li>\n</ul>')
+        self.assertEqual(Template(self.SOURCE, mode='compact').render(context),
+                         '<ul><li>Bob</li><li>admin</li></ul>')
+        self.assertRaises(ValueError, Template, self.SOURCE, mode='minified')
+
+    def test_renderers_agree(self):
+        for mode in OUTPUT_MODES:
+            template = Template(PAGE, mode=mode)
+            expected = template.render(get_context())
+            self.assertEqual(Template(PAGE, compiled=True, mode=mode).render(get_context()), expected)
+            self.assertEqual(''.join(render_to_stream(template, get_context(), flush_size=1)), expected)
+            self.assertEqual(asyncio.run(render_async(template, get_context())), expected)
+
+    def test_set_output_mode(self):
+        engine.set_loader(DictLoader({
+            'list.html': '<ul>{% for post in posts %}{% include post.partial %}{% endfor %}</ul>',
+            'item.html': '<li>\n<b>{{ post.title }}</b></li>',
+        }))
+        context = {'posts': [{'title': 'first', 'partial': 'item.html'}]}
+        self.assertIn('\n', engine.render_to_string('list.html', context))
+
+        set_output_mode('compact')
+        for compiled in (False, True):
+            self.assertEqual(engine.render_to_string('list.html', context, compiled=compiled),
+                             '<ul><li><b>first</b></li></ul>')
+        self.assertRaises(ValueError, set_output_mode, 'minified')
+
+    def test_mode_of_extended_and_included_templates(self):
+        engine.set_loader(DictLoader({
+            'base.html': '<div>\n  {% block content %}{% endblock %}\n</div>',
+            'item.html': '<li>\n  <b>{{ post.title }}</b>\n</li>',
+        }))
+        source = '{% extends "base.html" %}{% block content %}<ul>{% for post in posts %}{% include post.partial %}{% endfor %}</ul>{% endblock %}'
+        context = {'posts': [{'title': 'first', 'partial': 'item.html'}]}
+        engine.render_to_string('item.html', context)
+        for compiled in (False, True):
+            self.assertEqual(Template(source, compiled=compiled, mode='compact').render(context),
+                             '<div><ul><li><b>first</b></li></ul></div>')
+
+    def test_variables_outside_inner_text(self):
+        source = '<ul>{% for x in xs %}{{ x }}{% endfor %}</ul>{{ name }}<div>{{ name }}<p>hi</p></div>'
+        context = {'xs': [1, 2], 'name': 'Bob'}
+        for compiled in (False, True):
+            for mode in ('compact', 'preserve', 'verbatim'):
+                self.assertEqual(Template(source, compiled=compiled, mode=mode).render(context),
+                                 '<ul>12</ul>Bob<div>Bob<p>hi</p></div>')
+            self.assertEqual(Template(source, compiled=compiled).render(context).split(),
+                             ['<ul>12', '</ul>Bob', '<div>Bob', '<p>hi', '</p>', '</div>'])
+
+    def test_verbatim(self):
+        source = "  <input disabled data-x='1'>\n<p class=a>{{ name }} &amp;</p>{% if admin %} <b>!</b>{% endif %}\n"
+        template = Template(source, mode='verbatim')
+        self.assertEqual(template.render({'name': 'Bob', 'admin': True}),
+                         "  <input disabled data-x='1'>\n<p class=a>Bob &amp;</p> <b>!</b>\n")
+        self.assertNotIn(TAG_NODE, template.document.table.kinds)
+
+    def test_verbatim_inheritance(self):
+        engine.set_loader(DictLoader({
+            'base.html': '<html>\n<body>{% block content %}{% endblock %}</body>\n</html>\n',
+            'post.html': '{% extends "base.html" %}{% block content %}\n  {% include "title.html" %}\n{% endblock %}',
+            'title.html': '<h1 id=title>{{ title }}</h1>',
+        }))
+        set_output_mode('verbatim')
+        for compiled in (False, True):
+            self.assertEqual(engine.render_to_string('post.html', {'title': 'Hi'}, compiled=compiled),
+                             '<html>\n<body>\n  <h1 id=title>Hi</h1>\n</body>\n</html>\n')
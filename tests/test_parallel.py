@@ -0,0 +1,31 @@
+import pickle
+import unittest
+
+from engine.engine import Template
+from engine.parallel import render_many
+
+
+class TestRenderMany(unittest.TestCase):
+    SOURCE = '<p>{{ name }}{% if id > 3 %}<b>big</b>{% endif %}</p>'
+    
+    def setUp(self):
+        self.template = Template(self.SOURCE, compiled=True)
+        self.contexts = [{'name': f'user {i}', 'id': i} for i in range(200)]
+        self.expected = [self.template.render(context) for context in self.contexts]
+    
+    def test_template_pickles_compiled(self):
+        template = pickle.loads(pickle.dumps(self.template))
+        self.assertIsNotNone(template.render_function)
+        self.assertEqual(template.render(self.contexts[5]), self.expected[5])
+    
+    def test_ordered(self):
+        results = list(render_many(self.template, iter(self.contexts), workers=2, chunksize=7))
+        self.assertEqual(results, self.expected)
+    
+    def test_as_completed(self):
+        results = list(render_many(self.template, self.contexts, workers=2, chunksize=7, ordered=False))
+        self.assertEqual(sorted(results), list(enumerate(self.expected)))
+    
+    def test_template_name(self):
+        results = list(render_many('index.html', [], workers=1))
+        self.assertEqual(results, [])
@@ -1,5 +1,34 @@
 import unittest
 
+from engine.utils import PATH_CACHE, RetrieveVarsFromExpression, compile_path
+
 class TestUtils(unittest.TestCase):
     def test_engine(self):
-        self.assertTrue()
\ No newline at end of file
+        self.assertTrue()
+
+
+class Author:
+    def __init__(self, name):
+        self.name = name
+
+
+class TestCompilePath(unittest.TestCase):
+    def test_dict_attribute_and_index(self):
+        context = {'posts': [{'author': Author('James')}]}
+        self.assertEqual(compile_path('posts.0.author.name')(context), 'James')
+        self.assertEqual(compile_path('posts.-1.author.name')(context), 'James')
+    
+    def test_missing_values(self):
+        context = {'posts': []}
+        self.assertFalse(compile_path('posts.0.title')(context))
+        self.assertIsNone(compile_path('user.name')(context, None))
+    
+    def test_no_copy_and_cached(self):
+        posts = [{'title': 'a'}]
+        self.assertIs(compile_path('posts')({'posts': posts}), posts)
+        self.assertIs(compile_path('posts'), compile_path('posts'))
+        self.assertIn('posts', PATH_CACHE)
+    
+    def test_retrieve(self):
+        retriever = RetrieveVarsFromExpression('Variable', 'test.age', {'test': {'age': 20}})
+        self.assertEqual(retriever.manager(), '20')